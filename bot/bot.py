@@ -11,8 +11,7 @@ import logging
 import os
 import sys
 import time
-from copy import copy
-from typing import List
+from typing import List, Union
 
 import aiohttp
 import asqlite
@@ -23,6 +22,7 @@ from cogs.tags import Tags
 from discord.ext import commands
 from gears import cooldowns, users, util
 from gears.database import BennyDatabases
+from gears.pipeline import MessagePipeline
 from gears.terminal_printer import TerminalPrinter
 
 start = time.monotonic()
@@ -61,21 +61,20 @@ intents = discord.Intents(
 )
 
 
-async def get_prefix(_bot: commands.Bot, msg: discord.Message) -> List[str]:
+async def get_prefix(
+    _bot: commands.Bot, msg: discord.Message
+) -> Union[str, List[str], tuple]:
     """
-    Gets the prefix from built cache, if a guild isn't found (Direct Messages) assumes
-    prefix is just pinging the bot
+    Gets the prefix the message was sent with from the prefix managers tries, the
+    mention prefixes are always in there and Direct Messages use the default prefix
 
-    Raises AttributeError when the cache isn't built so we just have this quick fix,
-    the bot itself won't respond to anything until prefixes are built but this
-    silences noisy errors.
+    Returns the matched prefix so discord.py doesn't have to try every prefix
+    again, or an empty tuple when nothing matched. Until the prefix manager is
+    created we fall back to the default prefix and mentions.
     """
-    prefixes = [f"<@!{_bot.user.id}> ", f"<@{_bot.user.id}> "]
-    if _bot.LOADED_PREFIXES:
-        if msg.guild:
-            return prefixes + _bot.prefixes.get(str(msg.guild.id), "")
-        return prefixes.append(_bot.prefix)
-    return ""
+    if _bot.prefix_manager:
+        return await _bot.prefix_manager.match(msg) or ()
+    return [f"<@!{_bot.user.id}> ", f"<@{_bot.user.id}> ", _bot.PREFIX]
 
 
 async def when_bot_ready() -> None:
@@ -120,6 +119,8 @@ class BennyBot(commands.Bot):
     ping_list: list = []
     databases: BennyDatabases = BennyDatabases()
     user_manager: users.UserManager = None
+    prefix_manager = None
+    prefixes: dict = {}
     wavelink = None
 
     def __init__(self) -> None:
@@ -135,6 +136,8 @@ class BennyBot(commands.Bot):
         self.pcc: cooldowns.PremiumChecker = None
         self.tag_cog: Tags = None
         self.mystbin: mystbin.Client = mystbin.Client()
+        self.pipeline: MessagePipeline = MessagePipeline(self)
+        self.pipeline.register("commands", self.invoke_message)
 
     async def async_init(self) -> None:
         """
@@ -178,9 +181,11 @@ class BennyBot(commands.Bot):
 
     async def close(self) -> None:
         """
-        Close all aiohttp sessions on close as well as databases
+        Close all aiohttp sessions on close as well as databases and sentinel workers
         """
         await super().close()
+        if hasattr(self, "sentinel_manager"):
+            await self.sentinel_manager.close()
         for session in self.sessions.values():
             await session.close()
         await self.databases.users.close()
@@ -188,37 +193,31 @@ class BennyBot(commands.Bot):
 
     async def on_message(self, message: discord.Message) -> None:
         """
-        On message run through a few steps
+        Run every message through the pipeline, the context is built once there and
+        shared by commands, tags and every stage cogs register (afk, sentinel...)
+        """
+        await self.pipeline.run(message)
+
+    async def invoke_message(
+        self, message: discord.Message, ctx: commands.Context
+    ) -> None:
+        """
+        Commands stage of the pipeline
 
-        1. Ignore all bots, I don't care
-        2. Process any and all commands
-        3. Check if the command is a tag and we need to invoke it (Redo this ugly shit)
+        1. Invoke the command if there is one
+        2. Otherwise check if the command is a tag and we need to invoke it
         """
-        if message.author.bot:
-            return
-
-        await self.process_commands(message)
-
-        # Tags
-        ctx = await self.get_context(message)
-
-        if (
-            ctx.invoked_with
-            and ctx.invoked_with.lower() not in self.commands
-            and ctx.command is None
-        ):
-            msg = copy(message)
-            if ctx.prefix and ctx.guild:
-                args = msg.content[len(ctx.prefix) :].split(" ", 1)
-                if len(args) > 1:
-                    args = args[-1]
-                else:
-                    args = ""
-                named_tags = self.tag_cog.custom_tags.get(ctx.invoked_with)
-                if named_tags:
-                    _tag = named_tags.get(str(ctx.guild.id))
-                    if _tag:
-                        await self.tag_cog.invoke_custom_command(ctx, args, _tag, True)
+        await self.invoke(ctx)
+
+        if ctx.invoked_with and ctx.command is None and ctx.prefix and ctx.guild:
+            args = message.content[len(ctx.prefix) :].split(" ", 1)
+            if len(args) > 1:
+                args = args[-1]
+            else:
+                args = ""
+            _tag = await self.tag_cog.get_tag(ctx.guild.id, ctx.invoked_with)
+            if _tag:
+                await self.tag_cog.invoke_custom_command(ctx, args, _tag, True)
 
 
 bot = BennyBot()
@@ -228,15 +227,12 @@ bot = BennyBot()
 async def global_check(ctx: commands.context) -> bool:
     """
     Global check that applies to all commands
-    ├─ Check if prefixes are actually loaded
-    ├── Check if it's me, if so, let me do anything L
-    ├─── Check if the user is blacklisted from the bot
-    ├──── Check if command is disabled
-    ├───── Check if channel/thread is being ignored
-    └───────
+    ├─ Check if it's me, if so, let me do anything L
+    ├── Check if the user is blacklisted from the bot
+    ├─── Check if command is disabled
+    ├──── Check if channel/thread is being ignored
+    └─────
     """
-    if not bot.LOADED_PREFIXES:
-        return False
     if ctx.author.id == bot.owner_id:
         return True
     return True
@@ -44,15 +44,61 @@ class Base(commands.Cog):
         await self.bot.databases.servers.execute(
             """
             CREATE TABLE IF NOT EXISTS base_afk (
-                guild   TEXT    PRIMARY KEY
-                                NOT NULL,
-                user    TEXT    NOT NULL,
+                guild   INTEGER NOT NULL,
+                user    INTEGER NOT NULL,
                 message TEXT,
-                unix    INTEGER NOT NULL
-            );
+                unix    INTEGER NOT NULL,
+                PRIMARY KEY (
+                    guild,
+                    user
+                )
+            )
+            WITHOUT ROWID;
             """
         )
+        async with self.bot.databases.servers.cursor() as cursor:
+            columns = await cursor.execute("""PRAGMA table_info(base_afk);""")
+            if [column[5] for column in await columns.fetchall()][:2] != [1, 2]:
+                # Older tables keyed only by guild with TEXT ids, rebuild them in
+                # one transaction so nothing sees a half migrated table
+                try:
+                    await cursor.executescript(
+                        """
+                        BEGIN;
+                        CREATE TABLE base_afk_new (
+                            guild   INTEGER NOT NULL,
+                            user    INTEGER NOT NULL,
+                            message TEXT,
+                            unix    INTEGER NOT NULL,
+                            PRIMARY KEY (
+                                guild,
+                                user
+                            )
+                        )
+                        WITHOUT ROWID;
+                        INSERT OR REPLACE INTO base_afk_new
+                            SELECT CAST(guild AS INTEGER), CAST(user AS INTEGER), message, unix
+                            FROM base_afk;
+                        DROP TABLE base_afk;
+                        ALTER TABLE base_afk_new RENAME TO base_afk;
+                        COMMIT;
+                        """
+                    )
+                except Exception:
+                    # A no-op if the error came before BEGIN took effect, so the
+                    # migration error is the one that gets raised
+                    await self.bot.databases.servers.rollback()
+                    raise
+                await self.bot.terminal.load("Migrated base_afk to (guild, user) keys")
         await self.bot.databases.servers.commit()
+        await self.afk.load()
+        self.bot.pipeline.register("afk", self.afk_stage)
+
+    async def cog_unload(self) -> None:
+        """
+        Remove our message pipeline stage
+        """
+        self.bot.pipeline.unregister("afk")
 
     def format_commit(self, commit: pygit2.Commit) -> str:
         """
@@ -288,13 +334,12 @@ Total Uptime: {resolved_rel}"""
         """
         await self.afk.set_afk(ctx, message)
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message) -> None:
+    async def afk_stage(self, message: discord.Message, _ctx: commands.Context) -> None:
         """
-        On a message, check if that user is either pinging an afk user or is an afk user with an
-        active afk
+        Message pipeline stage, check if that user is either pinging an afk user or is
+        an afk user with an active afk
         """
-        if not message.author.bot:
+        if message.guild:
             await self.afk.manage_afk(message)
 
     @commands.hybrid_command(
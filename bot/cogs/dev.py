@@ -618,6 +618,181 @@ Shutting down the bot...
         await ctx.send(embed=embed)
         await self.bot.close()
 
+    @dev_group.command(
+        name="pipeline",
+        description="""View message pipeline stage timings""",
+        help="""View how long each message pipeline stage takes in milliseconds""",
+        brief="View message pipeline stage timings",
+        aliases=["mp"],
+        enabled=True,
+        hidden=True,
+    )
+    async def dev_pipeline_cmd(self, ctx: commands.Context) -> None:
+        """
+        View message pipeline stage timings
+        """
+        embed = discord.Embed(
+            title="Message Pipeline",
+            description=f"""Stages: `{", ".join(self.bot.pipeline.stages)}`""",
+            timestamp=discord.utils.utcnow(),
+            color=style.Color.AQUA,
+        )
+        for name, value in self.bot.pipeline.stats().items():
+            embed.add_field(
+                name=name,
+                value=f"""```\n{value}\n```""",
+                inline=False,
+            )
+        await ctx.send(embed=embed)
+
+    @dev_group.command(
+        name="tags",
+        description="""View tag use flushing stats""",
+        help="""View pending tag use counts, the flush interval and loaded tags""",
+        brief="View tag use flushing stats",
+        aliases=[],
+        enabled=True,
+        hidden=True,
+    )
+    async def dev_tags_cmd(self, ctx: commands.Context) -> None:
+        """
+        View tag use flushing stats
+        """
+        tags_cog = self.bot.get_cog("Tags")
+        if not tags_cog:
+            raise commands.BadArgument("The tags cog isn't loaded")
+
+        last_flush = (
+            f"<t:{round(tags_cog.last_flush)}:R>" if tags_cog.last_flush else "Never"
+        )
+        embed = discord.Embed(
+            title="Tag Stats",
+            description=f"""Flush Interval: `{tags_cog.flush_interval} seconds`
+            Pending Tags: `{len(tags_cog.pending_uses)}`
+            Pending Uses: `{sum(tags_cog.pending_uses.values())}`
+            Last Flush: {last_flush}
+            Loaded Tags: `{len(tags_cog.tags)}`
+            Lazy Guilds: `{f"{len(tags_cog.loaded_guilds)}/{tags_cog.lazy_guilds}, {tags_cog.lazy_idle}s idle" if tags_cog.lazy else "Off"}`""",
+            timestamp=discord.utils.utcnow(),
+            color=style.Color.ORANGE,
+        )
+        await ctx.send(embed=embed)
+
+    @dev_group.command(
+        name="users",
+        description="""View user profile cache stats""",
+        help="""View how many user profiles are in memory, what they cost and what lazy loading saves""",
+        brief="View user profile cache stats",
+        aliases=[],
+        enabled=True,
+        hidden=True,
+    )
+    async def dev_users_cmd(self, ctx: commands.Context) -> None:
+        """
+        View user profile cache stats
+        """
+        manager = self.bot.user_manager
+        if not manager:
+            raise commands.BadArgument("User profiles haven't been set up yet")
+
+        profiles = len(manager.users) + len(manager.cache)
+        memory = manager.memory()
+        per_profile = memory / profiles if profiles else 0
+        known = len(self.bot.users)
+        if manager.lazy:
+            savings = f"""Skipped Profiles: `{max(known - profiles, 0)}`
+            Memory Saved: `~{get_size(per_profile * max(known - profiles, 0))}`
+            Startup Load: `skipped`"""
+        else:
+            load = (
+                f"{round(manager.load_seconds * 1000, 2)}ms"
+                if manager.load_seconds is not None
+                else "not run"
+            )
+            savings = f"""Startup Load: `{load}`"""
+
+        embed = discord.Embed(
+            title="User Stats",
+            description=f"""Mode: `{"Lazy" if manager.lazy else "Preloaded"}`
+            Known Users: `{known}`
+            Profiles In Memory: `{profiles}` (`{len(manager.users)}` preloaded, `{len(manager.cache)}` cached)
+            Profile Memory: `{get_size(memory)}`
+            {savings}""",
+            timestamp=discord.utils.utcnow(),
+            color=style.Color.AQUA,
+        )
+        embed.add_field(
+            name="Profile Cache",
+            value=f"""```\n{manager.cache.render()}\n```""",
+            inline=False,
+        )
+        await ctx.send(embed=embed)
+
+    @dev_group.group(
+        name="sentinel",
+        description="""View sentinel pipeline stats""",
+        help="""View sentinel pipeline stats""",
+        brief="View sentinel pipeline stats",
+        aliases=["sm"],
+        enabled=True,
+        hidden=True,
+        invoke_without_command=True,
+    )
+    async def dev_sentinel_group(self, ctx: commands.Context) -> None:
+        """
+        View sentinel pipeline stats
+        """
+        sentinel_manager = getattr(self.bot, "sentinel_manager", None)
+        if not sentinel_manager:
+            raise commands.BadArgument("The sentinel manager hasn't been loaded yet")
+
+        embed = discord.Embed(
+            title="Sentinel Stats",
+            description=f"""Bot RSS: `{get_size(psutil.Process().memory_info().rss)}`""",
+            timestamp=discord.utils.utcnow(),
+            color=style.Color.RED,
+        )
+        for name, value in sentinel_manager.stats().items():
+            embed.add_field(
+                name=name,
+                value=f"""```\n{value}\n```""",
+                inline=False,
+            )
+        await ctx.send(embed=embed)
+
+    @dev_sentinel_group.command(
+        name="cache",
+        description="""Inspect or flush the sentinel result cache""",
+        help="""Inspect the sentinel result cache, pass flush to empty it""",
+        brief="Inspect or flush the sentinel result cache",
+        aliases=[],
+        enabled=True,
+        hidden=True,
+    )
+    async def dev_sentinel_cache_cmd(
+        self, ctx: commands.Context, action: str = None
+    ) -> None:
+        """
+        Inspect or flush the sentinel result cache
+        """
+        sentinel_manager = getattr(self.bot, "sentinel_manager", None)
+        if not sentinel_manager:
+            raise commands.BadArgument("The sentinel manager hasn't been loaded yet")
+
+        description = ""
+        if action == "flush":
+            description = f"Flushed {sentinel_manager.cache.clear()} entries\n"
+        elif action:
+            raise commands.BadArgument("The only action available is flush")
+
+        embed = discord.Embed(
+            title="Sentinel Result Cache",
+            description=f"""{description}```\n{sentinel_manager.cache.render()}\n```""",
+            timestamp=discord.utils.utcnow(),
+            color=style.Color.RED,
+        )
+        await ctx.send(embed=embed)
+
     @commands.group(
         name="redis",
         description="""Redis Group""",
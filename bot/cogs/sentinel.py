@@ -1,5 +1,8 @@
 import asyncio
+import hashlib
 import io
+import operator
+from typing import Optional, Tuple
 
 import aiohttp
 import asqlite
@@ -7,10 +10,47 @@ import cleantext
 import discord
 import discord.utils
 from colorama import Fore
-from detoxify import Detoxify
 from discord.ext import commands
 from gears import style
+from gears.alerts import AlertDispatcher
+from gears.cache import LRUCache
 from gears.database import BennyDatabases
+from gears.history import ChannelHistory
+from gears.inference import InferenceBatcher, create_backend
+from gears.prefilter import LexicalPrefilter
+
+
+LABELS = (
+    "toxicity",
+    "severe_toxicity",
+    "obscene",
+    "identity_attack",
+    "insult",
+    "threat",
+    "sexual_explicit",
+)
+FIELDS = LABELS + ("average",)
+BAR_WIDTH = 50
+BAR_COLORS = (Fore.RED, Fore.YELLOW, Fore.GREEN)
+BAR_HEADERS = tuple(f"{field.replace('_', ' ').title():<44}" for field in FIELDS)
+BARS = tuple(
+    tuple(
+        f"{color}{num * '█'}{Fore.WHITE}{(BAR_WIDTH - num) * '█'}"
+        for num in range(BAR_WIDTH + 1)
+    )
+    for color in BAR_COLORS
+)
+
+
+def field_property(fields: str, index: int) -> property:
+    """
+    Expose one slot of an objects FIELDS ordered tuple as a plain attribute
+    """
+
+    def getter(self) -> float:
+        return getattr(self, fields)[index]
+
+    return property(getter, doc=FIELDS[index])
 
 
 class Toxicity:
@@ -19,22 +59,15 @@ class Toxicity:
 
     Attributes
     ----------
+    scores: Tuple[float, ...]
+        Every score in FIELDS order, also available by name
     toxicity: float
         Toxic level
     severe_toxicity: float
 
     """
 
-    __slots__ = (
-        "toxicity",
-        "severe_toxicity",
-        "obscene",
-        "identity_attack",
-        "insult",
-        "threat",
-        "sexual_explicit",
-        "average",
-    )
+    __slots__ = ("scores",)
 
     def __init__(self, prediction: dict) -> None:
         """
@@ -45,31 +78,51 @@ class Toxicity:
         prediction: dict
             The prediction dict to build the Toxicity object off of
         """
-        self.toxicity = round(prediction.get("toxicity"), 5) * 100
-        self.severe_toxicity = round(prediction.get("severe_toxicity"), 5) * 100
-        self.obscene = round(prediction.get("obscene"), 5) * 100
-        self.identity_attack = round(prediction.get("identity_attack"), 5) * 100
-        self.insult = round(prediction.get("insult"), 5) * 100
-        self.threat = round(prediction.get("threat"), 5) * 100
-        self.sexual_explicit = round(prediction.get("sexual_explicit"), 5) * 100
-        self.average = (
+        toxicity = round(prediction["toxicity"], 5) * 100
+        severe_toxicity = round(prediction["severe_toxicity"], 5) * 100
+        obscene = round(prediction["obscene"], 5) * 100
+        identity_attack = round(prediction["identity_attack"], 5) * 100
+        insult = round(prediction["insult"], 5) * 100
+        threat = round(prediction["threat"], 5) * 100
+        sexual_explicit = round(prediction["sexual_explicit"], 5) * 100
+        self.scores = (
+            toxicity,
+            severe_toxicity,
+            obscene,
+            identity_attack,
+            insult,
+            threat,
+            sexual_explicit,
             round(
-                self.toxicity
-                + self.severe_toxicity
-                + self.obscene
-                + self.identity_attack
-                + self.insult
-                + self.threat
-                + self.sexual_explicit,
+                toxicity
+                + severe_toxicity
+                + obscene
+                + identity_attack
+                + insult
+                + threat
+                + sexual_explicit,
                 5,
             )
-            / 7
+            / 7,
         )
 
+    toxicity = field_property("scores", 0)
+    severe_toxicity = field_property("scores", 1)
+    obscene = field_property("scores", 2)
+    identity_attack = field_property("scores", 3)
+    insult = field_property("scores", 4)
+    threat = field_property("scores", 5)
+    sexual_explicit = field_property("scores", 6)
+    average = field_property("scores", 7)
+
 
 class SentinelConfig:
     """
     Config object
+
+    Thresholds are kept in FIELDS order in the thresholds tuple so a guilds
+    config can be compared against scores in one pass, they're still available by
+    name too.
     """
 
     __slots__ = (
@@ -78,14 +131,8 @@ class SentinelConfig:
         "webhook",
         "username",
         "avatar",
-        "toxicity",
-        "severe_toxicity",
-        "obscene",
-        "identity_attack",
-        "insult",
-        "threat",
-        "sexual_explicit",
-        "average",
+        "thresholds",
+        "full_model",
     )
 
     def __init__(
@@ -102,31 +149,47 @@ class SentinelConfig:
         insult: int,
         threat: int,
         sexual_explicit: int,
+        full_model: bool = False,
     ) -> None:
         """
         Init for config
+
+        full_model skips the lexical pre-filter so every message goes to the model
         """
-        self.channels = channels.split("-")
+        self.channels = frozenset(
+            int(channel) for channel in channels.split("-") if channel.isdigit()
+        )
         self.premium = premium
         self.webhook = webhook
         self.username = username
         self.avatar = avatar
-        self.toxicity = toxicity
-        self.severe_toxicity = severe_toxicity
-        self.obscene = obscene
-        self.identity_attack = identity_attack
-        self.insult = insult
-        self.threat = threat
-        self.sexual_explicit = sexual_explicit
-        self.average = (
-            toxicity
-            + severe_toxicity
-            + obscene
-            + identity_attack
-            + insult
-            + threat
-            + sexual_explicit
-        ) / 7
+        thresholds = [
+            toxicity,
+            severe_toxicity,
+            obscene,
+            identity_attack,
+            insult,
+            threat,
+            sexual_explicit,
+        ]
+        thresholds.append(sum(thresholds) / len(LABELS))
+        self.thresholds = tuple(thresholds)
+        self.full_model = bool(full_model)
+
+    toxicity = field_property("thresholds", 0)
+    severe_toxicity = field_property("thresholds", 1)
+    obscene = field_property("thresholds", 2)
+    identity_attack = field_property("thresholds", 3)
+    insult = field_property("thresholds", 4)
+    threat = field_property("thresholds", 5)
+    sexual_explicit = field_property("thresholds", 6)
+    average = field_property("thresholds", 7)
+
+    def breached(self, toxicity: Toxicity) -> bool:
+        """
+        Whether a messages scores break any of our thresholds
+        """
+        return any(map(operator.gt, toxicity.scores, self.thresholds))
 
 
 class SentinelManager:
@@ -140,133 +203,185 @@ class SentinelManager:
         db: asqlite.Connection,
         loop: asyncio.AbstractEventLoop,
         avatar: str,
+        options: dict = None,
     ) -> None:
         """
         Init the sentinel manager with everything it needs
+
+        options is the Sentinel section of bot_config.json
         """
-        self.sentinel = Detoxify(model_type="unbiased")
+        options = options or {}
+        self.backend = create_backend(options, loop)
         self.loop = loop
+        self.batcher = InferenceBatcher(
+            self.backend.predict,
+            options.get("BatchSize", 16),
+            options.get("BatchWait", 25),
+            self.backend.concurrency,
+        )
+        self.cache = LRUCache(
+            options.get("CacheSize", 4096), options.get("CacheTTL", 600)
+        )
+        self.inflight = {}
+        self.prefilter = LexicalPrefilter(
+            options.get("PreFilterPatterns", ()),
+            options.get("PreFilterCaps", 0.7),
+            options.get("PreFilter", False),
+        )
+        self.history = ChannelHistory(
+            options.get("HistorySize", 5), options.get("HistoryChannels", 1000)
+        )
+        self.alerts = AlertDispatcher(
+            session,
+            options.get("AlertWindow", 30),
+            options.get("AlertRate", 5),
+            options.get("AlertPer", 2),
+        )
         self.db: asqlite.Connection = db
         self.sentinels = {}
         self.session = session
         self.username = "Benny Sentinel"
         self.avatar = avatar
 
-    async def process(self, msg: discord.Message) -> None:
+    def watching(self, msg: discord.Message) -> Optional[SentinelConfig]:
+        """
+        Get the config for a message if its channel is being watched
+
+        Only does a dict and set lookup, so it's cheap enough to run on every message
+        """
+        if msg.guild is None:
+            return None
+        sentinel = self.sentinels.get(msg.guild.id)
+        if sentinel is None or msg.channel.id not in sentinel.channels:
+            return None
+        return sentinel
+
+    async def process(
+        self, msg: discord.Message, sentinel: SentinelConfig = None
+    ) -> None:
         """
         Process a message and everything
         """
         if msg.author.bot:
             return
 
-        sentinel = self.sentinels.get(str(msg.guild.id))
-        if not sentinel or str(msg.channel.id) not in sentinel.channels:
-            pass
+        sentinel = sentinel or self.watching(msg)
+        if not sentinel:
+            return
 
-        else:
-            toxicity = await self.check(msg.clean_content)
-            if (
-                toxicity.toxicity > sentinel.toxicity
-                or toxicity.severe_toxicity > sentinel.severe_toxicity
-                or toxicity.obscene > sentinel.obscene
-                or toxicity.identity_attack > sentinel.identity_attack
-                or toxicity.insult > sentinel.insult
-                or toxicity.threat > sentinel.threat
-                or toxicity.sexual_explicit > sentinel.sexual_explicit
-                or toxicity.average > sentinel.average
-            ):
-                webhook = discord.Webhook.from_url(
-                    url=sentinel.webhook,
-                    session=self.session,
-                )
+        content = msg.clean_content
+        if len(content) <= 25:
+            return
 
-                values = []
+        if not sentinel.full_model and not self.prefilter.suspicious(content):
+            return
 
-                values.append(f"{toxicity.toxicity}-{sentinel.toxicity}")
-                values.append(f"{toxicity.severe_toxicity}-{sentinel.severe_toxicity}")
-                values.append(f"{toxicity.obscene}-{sentinel.obscene}")
-                values.append(f"{toxicity.identity_attack}-{sentinel.identity_attack}")
-                values.append(f"{toxicity.insult}-{sentinel.insult}")
-                values.append(f"{toxicity.threat}-{sentinel.threat}")
-                values.append(f"{toxicity.sexual_explicit}-{sentinel.sexual_explicit}")
-                values.append(f"{toxicity.average}-{sentinel.average}")
+        toxicity = await self.check(content)
+        if sentinel.breached(toxicity):
+            embed = discord.Embed(
+                title="Sentinel Alert",
+                description=await self.gen_toxicity_bar(toxicity, sentinel),
+                timestamp=discord.utils.utcnow(),
+                color=style.Color.RED,
+            )
 
-                embed = discord.Embed(
-                    title="Sentinel Alert",
-                    description=await self.gen_toxicity_bar(values),
-                    timestamp=discord.utils.utcnow(),
-                    color=style.Color.RED,
+            for record in self.history.recent(msg.channel.id):
+                embed.add_field(
+                    name=f"{record.author} - {record.author_id}",
+                    value=record.content or "No message content.",
+                    inline=False,
                 )
-
-                for msg in reversed(
-                    [message async for message in msg.channel.history(limit=5)]
-                ):
-                    preview = msg.content
-                    if not preview:
-                        preview = "No message content."
-                    elif len(msg.content) > 500:
-                        preview = f"{msg.content[:497]}..."
-                    embed.add_field(
-                        name=f"{msg.author.name}#{msg.author.discriminator} - {msg.author.id}",
-                        value=preview,
-                        inline=False,
-                    )
-                await webhook.send(embed=embed)
+            self.alerts.submit(msg.guild.id, sentinel.webhook, msg.author.id, embed)
 
     async def check(self, msg: str) -> Toxicity:
         """
         Check a message and return a toxicity class
+
+        Identical messages (after normalizing) are served from the cache, and
+        identical messages already being scored wait on that result instead
+        """
+        key = hashlib.blake2b(
+            " ".join(msg.lower().split()).encode(), digest_size=16
+        ).digest()
+        toxicity = self.cache.get(key)
+        if toxicity:
+            return toxicity
+
+        pending = self.inflight.get(key)
+        if pending:
+            return await asyncio.shield(pending)
+
+        pending = self.loop.create_future()
+        self.inflight[key] = pending
+        try:
+            toxicity = Toxicity(await self.batcher.predict(msg))
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            pending.exception()
+            raise
+        else:
+            self.cache.set(key, toxicity)
+            pending.set_result(toxicity)
+        finally:
+            del self.inflight[key]
+        return toxicity
+
+    async def start(self) -> None:
         """
-        return Toxicity(
-            await self.loop.run_in_executor(None, self.sentinel.predict, msg)
-        )
+        Start the inference backend, batcher and alert dispatcher
+        """
+        await self.backend.start()
+        self.batcher.start()
+        self.alerts.start()
 
-    async def gen_toxicity_bar(self, values: list) -> str:
+    async def close(self) -> None:
         """
-        Generate a nice loading bar based on the stuff we output, custom built to show progress bars
+        Stop the batcher and alert dispatcher and shut down the inference backend
         """
-        bars = []
-        bars_colors = []
-        for value in values:
-            val1 = float(value.split("-")[0])
-            val2 = float(value.split("-")[1])
+        await self.batcher.close()
+        await self.backend.close()
+        await self.alerts.close()
 
-            posneg = val1 > val2
+    def stats(self) -> dict:
+        """
+        Gather stats from every stage of the pipeline for the dev command
+        """
+        return {
+            **self.backend.stats(),
+            **self.prefilter.stats(),
+            **self.batcher.stats(),
+            "Result Cache": self.cache.render(),
+            "Message History": self.history.stats(),
+            "Alert Dispatcher": self.alerts.stats(),
+        }
 
-            if posneg:
-                bar_color = Fore.RED
-            elif val1 > val2 / 2:
-                bar_color = Fore.YELLOW
-            else:
-                bar_color = Fore.GREEN
+    async def gen_toxicity_bar(
+        self, toxicity: Toxicity, sentinel: SentinelConfig
+    ) -> str:
+        """
+        Generate a nice loading bar based on the stuff we output, custom built to show progress bars
 
-            bar_num = round(val1 / (100 / 50))
+        The bars themselves come straight out of the prebuilt BARS table
+        """
+        lines = []
+        for header, score, threshold in zip(
+            BAR_HEADERS, toxicity.scores, sentinel.thresholds
+        ):
+            if score > threshold:
+                color = 0
+            elif score > threshold / 2:
+                color = 1
+            else:
+                color = 2
+            num = min(max(round(score / (100 / BAR_WIDTH)), 0), BAR_WIDTH)
+            lines.append(f"{header}{BAR_COLORS[color]}{round(score, 2)}%")
+            lines.append(BARS[color][num])
 
-            bars.append(
-                f"""{bar_color}{bar_num * "█"}{Fore.WHITE}{(50 - bar_num) * "█"}"""
-            )
-            bars_colors.append(bar_color)
-
-        view = f"""```ansi
-{Fore.WHITE}Toxicity                                    {bars_colors[0]}{round(float(values[0].split("-")[0]), 2)}%
-{bars[0]}
-Severe Toxicity                             {bars_colors[1]}{round(float(values[1].split("-")[0]), 2)}%
-{bars[1]}
-Obscene                                     {bars_colors[2]}{round(float(values[2].split("-")[0]), 2)}%
-{bars[2]}
-Identity Attack                             {bars_colors[3]}{round(float(values[3].split("-")[0]), 2)}%
-{bars[3]}
-Insult                                      {bars_colors[4]}{round(float(values[4].split("-")[0]), 2)}%
-{bars[4]}
-Threat                                      {bars_colors[5]}{round(float(values[5].split("-")[0]), 2)}%
-{bars[5]}
-Sexual Explicit                             {bars_colors[6]}{round(float(values[6].split("-")[0]), 2)}%
-{bars[6]}
-Average                                     {bars_colors[7]}{round(float(values[7].split("-")[0]), 2)}%
-{bars[7]}
-```"""
-
-        return view
+        view = "\n".join(lines)
+        return f"```ansi\n{Fore.WHITE}{view}\n```"
 
     async def load_sentinels(self) -> None:
         """
@@ -278,7 +393,7 @@ Average                                     {bars_colors[7]}{round(float(values[
             data = await data.fetchall()
             if data:
                 for config in data:
-                    self.sentinels[config[0]] = SentinelConfig(
+                    self.sentinels[int(config[0])] = SentinelConfig(
                         config[1],
                         config[2],
                         config[3],
@@ -291,6 +406,7 @@ Average                                     {bars_colors[7]}{round(float(values[
                         config[10],
                         config[11],
                         config[12],
+                        config[13],
                     )
 
     async def load_sentinel(self, guild: str) -> None:
@@ -302,7 +418,7 @@ Average                                     {bars_colors[7]}{round(float(values[
                 """SELECT * FROM sentinels_config WHERE guild = ?;""", (str(guild),)
             ) as data:
                 config = await data.fetchone()
-                self.sentinels[config[0]] = SentinelConfig(
+                self.sentinels[int(config[0])] = SentinelConfig(
                     config[1],
                     config[2],
                     config[3],
@@ -315,6 +431,7 @@ Average                                     {bars_colors[7]}{round(float(values[
                     config[10],
                     config[11],
                     config[12],
+                    config[13],
                 )
 
     async def save_default_config(self, ctx: commands.Context) -> None:
@@ -323,7 +440,7 @@ Average                                     {bars_colors[7]}{round(float(values[
         """
         await ctx.defer()
 
-        sentinel = self.sentinels.get(str(ctx.guild.id))
+        sentinel = self.sentinels.get(ctx.guild.id)
 
         if not sentinel:
             overwrites = {
@@ -375,7 +492,7 @@ Average                                     {bars_colors[7]}{round(float(values[
         """
         await self.db.execute(
             """
-            INSERT INTO sentinels_config VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+            INSERT INTO sentinels_config VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
             """,
             (
                 str(guild),
@@ -391,16 +508,28 @@ Average                                     {bars_colors[7]}{round(float(values[
                 75,
                 75,
                 75,
+                False,
             ),
         )
         await self.db.commit()
         await self.load_sentinel(guild)
 
+    async def set_full_model(self, guild: int, full_model: bool) -> None:
+        """
+        Set whether a guild skips the pre-filter and sends everything to the model
+        """
+        await self.db.execute(
+            """UPDATE sentinels_config SET full_model = ? WHERE guild = ?;""",
+            (full_model, str(guild)),
+        )
+        await self.db.commit()
+        await self.load_sentinel(guild)
+
     async def view_config(self, ctx: commands.Context) -> None:
         """
         View current sentinel setup for a server
         """
-        sentinel = self.sentinel.get(str(ctx.guild.id))
+        sentinel = self.sentinels.get(ctx.guild.id)
         if not sentinel:
             raise commands.BadArgument(
                 "You need to create a Sentinel config with /sentinel default!"
@@ -727,6 +856,12 @@ class Sentinel(commands.Cog):
         self.sm: SentinelManager = None
         self.decancer: DecancerManager = None
 
+    async def cog_unload(self) -> None:
+        """
+        Remove our message pipeline stage
+        """
+        self.bot.pipeline.unregister("sentinel")
+
     async def clean_username(self, username: str) -> str:
         """
         Clean a username
@@ -772,6 +907,8 @@ class Sentinel(commands.Cog):
         if hasattr(self.bot, "decancer_manager"):
             self.decancer = self.bot.decancer_manager
 
+        self.bot.pipeline.register("sentinel", self.sentinel_stage, bots=True)
+
     @commands.Cog.listener()
     async def on_load_sentinel_managers(self) -> None:
         """
@@ -793,10 +930,18 @@ class Sentinel(commands.Cog):
                 identity_attack INT  NOT NULL,
                 insult          INT  NOT NULL,
                 threat          INT  NOT NULL,
-                sexual_explicit INT  NOT NULL
+                sexual_explicit INT  NOT NULL,
+                full_model      BOOL NOT NULL
+                                     DEFAULT (False)
             );
             """
         )
+        async with self.databases.servers.cursor() as cursor:
+            columns = await cursor.execute("""PRAGMA table_info(sentinels_config);""")
+            if "full_model" not in [column[1] for column in await columns.fetchall()]:
+                await cursor.execute(
+                    """ALTER TABLE sentinels_config ADD COLUMN full_model BOOL NOT NULL DEFAULT (False);"""
+                )
         await self.databases.servers.execute(
             """
             CREATE TABLE IF NOT EXISTS sentinels_decancer (
@@ -817,8 +962,10 @@ class Sentinel(commands.Cog):
             self.databases.servers,
             self.bot.loop,
             self.bot.user.avatar.url,
+            self.bot.config.get("Sentinel", {}),
         )
         self.bot.sentinel_manager = self.sm
+        await self.sm.start()
         await self.sm.load_sentinels()
 
         self.decancer = DecancerManager(
@@ -826,13 +973,54 @@ class Sentinel(commands.Cog):
         )
         self.bot.decancer_manager = self.decancer
 
+    async def sentinel_stage(
+        self, msg: discord.Message, _ctx: commands.Context = None
+    ) -> None:
+        """
+        Sentinels time :) message pipeline stage, this also gets bot messages so
+        they show up in alert history
+
+        Check the channel is watched first, clean_content resolves every mention so
+        we only want to touch it when we actually have to
+        """
+        if not self.sm:
+            return
+        sentinel = self.sm.watching(msg)
+        if sentinel:
+            self.sm.history.record(msg)
+            if not msg.author.bot:
+                await self.sm.process(msg, sentinel)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent) -> None:
+        """
+        Keep sentinel history up to date with edits
+        """
+        if self.sm and "content" in payload.data:
+            self.sm.history.edit(
+                payload.channel_id, payload.message_id, payload.data["content"]
+            )
+
     @commands.Cog.listener()
-    async def on_message(self, msg: discord.Message) -> None:
+    async def on_raw_message_delete(
+        self, payload: discord.RawMessageDeleteEvent
+    ) -> None:
         """
-        Sentinels time :)
+        Drop deleted messages from sentinel history
         """
-        if len(msg.clean_content) > 25:
-            await self.sm.process(msg)
+        if self.sm:
+            self.sm.history.delete(payload.channel_id, payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(
+        self, payload: discord.RawBulkMessageDeleteEvent
+    ) -> None:
+        """
+        Drop bulk deleted messages from sentinel history
+        """
+        if self.sm:
+            for message_id in payload.message_ids:
+                self.sm.history.delete(payload.channel_id, message_id)
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member) -> None:
@@ -909,6 +1097,37 @@ class Sentinel(commands.Cog):
         """
         await self.sm.send_config(ctx)
 
+    @sentinel_cmd.command(
+        name="fullmodel",
+        description="""Send every watched message to the full model""",
+        help="""Skip the quick keyword pre-filter so every watched message is checked by the full model""",
+        brief="Toggle skipping the sentinel pre-filter",
+        aliases=["full"],
+        enabled=True,
+        hidden=False,
+    )
+    @commands.cooldown(1.0, 5.0, commands.BucketType.user)
+    @commands.has_permissions(manage_guild=True)
+    async def sentinel_fullmodel_cmd(
+        self, ctx: commands.Context, enabled: bool
+    ) -> None:
+        """
+        Toggle skipping the pre-filter
+        """
+        if not self.sm.sentinels.get(ctx.guild.id):
+            raise commands.BadArgument(
+                "You need to create a Sentinel config with /sentinel default!"
+            )
+        await self.sm.set_full_model(ctx.guild.id, enabled)
+
+        embed = discord.Embed(
+            title="Success",
+            description=f"""Every watched message will {"now" if enabled else "no longer"} be checked by the full model.""",
+            timestamp=discord.utils.utcnow(),
+            color=style.Color.GREEN,
+        )
+        await ctx.send(embed=embed)
+
     @commands.hybrid_group(
         name="decancer",
         description="""Decancer Group""",
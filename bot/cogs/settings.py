@@ -1,23 +1,97 @@
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+
 import asqlite
 import discord
 import discord.utils
 from colorama import Fore
-from discord.ext import commands
+from discord.ext import commands, tasks
 from gears import style, users
 from gears.database import BennyDatabases
+from gears.prefixes import PrefixTrie
 
 
 class PrefixManager:
     """
     A way to update prefixes both in the bot's cache and in the database with nice simple functions
+
+    Every guilds prefixes, plus the mention prefixes, are also compiled into a
+    PrefixTrie so get_prefix only has to walk the start of a message once.
     """
 
     def __init__(self, bot: commands.Bot, database: asqlite.Connection) -> None:
         """
-        Init
+        Init, the bot has to be logged in so we can build the mention prefixes
         """
         self.bot = bot
         self.database = database
+        self.mentions = (f"<@!{bot.user.id}> ", f"<@{bot.user.id}> ")
+        self.tries: Dict[int, PrefixTrie] = {}
+        self.dm_trie = PrefixTrie((*self.mentions, bot.PREFIX))
+        self.loading: Dict[int, asyncio.Future] = {}
+
+    def cache_prefixes(self, guild: str, prefixes: list) -> None:
+        """
+        Store a guilds prefixes and rebuild its trie
+
+        Parameters
+        ----------
+        guild: str
+            The guild id
+        prefixes: list
+            The guilds prefixes
+        """
+        self.bot.prefixes[str(guild)] = prefixes
+        self.tries[int(guild)] = PrefixTrie((*self.mentions, *prefixes))
+
+    async def match(self, msg: discord.Message) -> Optional[str]:
+        """
+        Find the prefix a message was sent with, guilds that haven't been loaded yet
+        are looked up on their own
+
+        Parameters
+        ----------
+        msg: discord.Message
+            The message
+
+        Returns
+        -------
+        Optional[str]
+            The longest matching prefix, None if there isn't one
+        """
+        if msg.guild is None:
+            return self.dm_trie.match(msg.content)
+        trie = self.tries.get(msg.guild.id)
+        if trie is None:
+            trie = await self.load_guild(msg.guild.id)
+        return trie.match(msg.content)
+
+    async def load_guild(self, guild: int) -> PrefixTrie:
+        """
+        Load a single guilds prefixes while the bulk load is still running, every
+        message for the guild that comes in meanwhile waits on the same lookup
+
+        Parameters
+        ----------
+        guild: int
+            The guild id
+
+        Returns
+        -------
+        PrefixTrie
+        """
+        pending = self.loading.get(guild)
+        if pending is None:
+            pending = self.loading[guild] = asyncio.ensure_future(
+                self.get_prefixes(guild)
+            )
+            pending.add_done_callback(lambda _: self.loading.pop(guild, None))
+        prefixes = await asyncio.shield(pending)
+        if guild not in self.tries:
+            self.cache_prefixes(guild, prefixes)
+        return self.tries[guild]
 
     def sanitize_prefix(self, prefix: str) -> str:
         """
@@ -75,6 +149,51 @@ class PrefixManager:
             await self.add_guild(guild)
             return [self.bot.PREFIX]
 
+    async def load_guilds(self, guilds: List[int]) -> int:
+        """
+        Load every guilds prefixes with a single query, guilds we don't have yet get
+        the default prefix inserted in one transaction
+
+        Guilds that were already loaded on their own while we waited are skipped,
+        their cache may be newer than what we read.
+
+        Parameters
+        ----------
+        guilds: List[int]
+            The guild ids to load
+
+        Returns
+        -------
+        int
+            How many guilds had to be inserted
+        """
+        async with self.database.execute(
+            """SELECT guild, prefixes FROM settings_prefixes;"""
+        ) as cursor:
+            stored = dict(await cursor.fetchall())
+
+        missing = []
+        for guild in guilds:
+            if int(guild) in self.tries:
+                continue
+            if str(guild) in stored:
+                prefixes = (stored[str(guild)] or "").split(":|:")
+                self.cache_prefixes(guild, sorted(prefixes, key=len))
+            else:
+                missing.append(str(guild))
+                self.cache_prefixes(guild, [self.bot.PREFIX])
+
+        if missing:
+            # One statement so the whole batch lands or none of it does
+            await self.database.execute(
+                """
+                INSERT OR IGNORE INTO settings_prefixes
+                SELECT value, ? FROM json_each(?);
+                """,
+                (self.bot.PREFIX, json.dumps(missing)),
+            )
+        return len(missing)
+
     async def add_prefix(self, guild: str, prefix: str) -> None:
         """
         Add a prefix to a guild, adds to both our database and cache
@@ -108,7 +227,7 @@ class PrefixManager:
             prefixes.append(prefix)
             if prefixes:
                 prefixes = sorted(prefixes, key=len)
-            self.bot.prefixes[str(guild)] = prefixes
+            self.cache_prefixes(guild, prefixes)
             await self.database.execute(
                 """UPDATE settings_prefixes SET prefixes = ? WHERE guild = ?;""",
                 (self.prefixes_to_string(prefixes), str(guild)),
@@ -139,7 +258,7 @@ class PrefixManager:
                 f"You don't have {prefix} as a prefix in your server"
             )
         prefixes.remove(prefix)
-        self.bot.prefixes[str(guild)] = prefixes
+        self.cache_prefixes(guild, prefixes)
         await self.database.execute(
             """UPDATE settings_prefixes SET prefixes = ? WHERE guild = ?;""",
             (self.prefixes_to_string(prefixes), str(guild)),
@@ -159,9 +278,9 @@ class PrefixManager:
         -------
         None
         """
-        self.bot.prefixes[str(guild)] = [self.bot.PREFIX]
+        self.cache_prefixes(guild, [self.bot.PREFIX])
         await self.database.execute(
-            """INSERT INTO settings_prefixes VALUES(?, ?);""",
+            """INSERT OR IGNORE INTO settings_prefixes VALUES(?, ?);""",
             (str(guild), self.bot.PREFIX),
         )
         await self.database.commit()
@@ -184,7 +303,8 @@ class PrefixManager:
         -------
         None
         """
-        del self.bot.prefixes[str(guild)]
+        self.bot.prefixes.pop(str(guild), None)
+        self.tries.pop(int(guild), None)
         await self.database.execute(
             """DELETE FROM settings_prefixes WHERE guild = ?;""", (str(guild),)
         )
@@ -229,24 +349,63 @@ class Settings(commands.Cog):
             """
         )
         await self.databases.users.commit()
-        self.bot.user_manager = users.UserManager(self.bot, self.databases.users)
+        options = self.bot.config.get("Users", {})
+        self.bot.user_manager = users.UserManager(
+            self.bot,
+            self.databases.users,
+            options.get("CacheSize", 10000),
+            options.get("Lazy", False),
+            options.get("LazyIdle", 1800),
+        )
+        if self.bot.user_manager.lazy:
+            self.expire_users.start()
+
+    async def cog_unload(self) -> None:
+        """
+        Stop expiring idle user profiles
+        """
+        self.expire_users.cancel()
+
+    @tasks.loop(minutes=1.0)
+    async def expire_users(self) -> None:
+        """
+        Drop lazy user profiles nobody has used in a while
+        """
+        self.bot.user_manager.cache.expire()
 
     @commands.Cog.listener()
     async def on_load_users(self) -> None:
         """
         Loading users into cache
         """
-        await self.bot.user_manager.load_users()
-        await self.bot.terminal.load("Users")
+        if self.bot.user_manager.lazy:
+            await self.bot.terminal.load("Users lazily, profiles load on first command")
+            return
+
+        start = time.perf_counter()
+        inserted = await self.bot.user_manager.load_users()
+        self.bot.user_manager.load_seconds = time.perf_counter() - start
+        await self.bot.terminal.load(
+            f"Users for {len(self.bot.users)} users ({inserted} new) in "
+            f"{round((time.perf_counter() - start) * 1000, 2)}ms"
+        )
+
+    @commands.Cog.listener()
+    async def on_command(self, ctx: commands.Context) -> None:
+        """
+        Make the authors profile when they first use a command in lazy mode
+        """
+        if self.bot.user_manager and self.bot.user_manager.lazy:
+            await self.bot.user_manager.get_user(ctx.author.id)
 
     @commands.Cog.listener()
     async def on_load_prefixes(self) -> None:
         """
         Loading every prefix into a cache so we can quickly access it
-        """
-        self.bot.prefixes = {}
-        self.bot.prefix_manager = PrefixManager(self.bot, self.databases.servers)
 
+        Commands work as soon as the manager exists, guilds the bulk load hasn't
+        reached yet are looked up one by one when they send a message
+        """
         await self.databases.servers.execute(
             """
             CREATE TABLE IF NOT EXISTS settings_prefixes (
@@ -255,13 +414,19 @@ class Settings(commands.Cog):
             );
             """
         )
-        for guild in self.bot.guilds:
-            prefixes = await self.bot.prefix_manager.get_prefixes(guild.id)
-            self.bot.prefixes[str(guild.id)] = prefixes
+        self.bot.prefixes = {}
+        self.bot.prefix_manager = PrefixManager(self.bot, self.databases.servers)
 
+        start = time.perf_counter()
+        inserted = await self.bot.prefix_manager.load_guilds(
+            [guild.id for guild in self.bot.guilds]
+        )
         self.bot.LOADED_PREFIXES = True
 
-        await self.bot.terminal.load("Prefixes")
+        await self.bot.terminal.load(
+            f"Prefixes for {len(self.bot.guilds)} guilds ({inserted} new) in "
+            f"{round((time.perf_counter() - start) * 1000, 2)}ms"
+        )
 
     @commands.Cog.listener()
     async def on_guild_join(self, guild: discord.Guild) -> None:
@@ -1,14 +1,20 @@
 import asyncio
+import bisect
+import json
+import re
 import time
-from typing import Any, Dict, List, Union
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple, Union
 
 import asqlite
 import bTagScript as tse
 import discord
 import discord.utils
-from discord.ext import commands
+from discord import app_commands
+from discord.ext import commands, tasks
 from gears import style
 from gears.database import BennyDatabases
+from gears.tagscript import BlockTiming, ProfilingInterpreter, render_profile
 
 FAKE_SEED = {
     "user": None,
@@ -17,6 +23,8 @@ FAKE_SEED = {
     "server": None,
     "args": None,
 }
+TARGET_BLOCKS = ("require", "whitelist", "blacklist")
+ID_REGEX = re.compile(r"<?(?:@[!&]?|#)?([0-9]{15,20})>?$")
 
 
 def clean(text: str) -> str:
@@ -28,22 +36,6 @@ def clean(text: str) -> str:
     return ""
 
 
-def guild_check(custom_tags: dict) -> bool:
-    """
-    Guild check for custom_tags
-    """
-
-    def predicate(ctx: commands.Context) -> bool:
-        """
-        Predicate
-        """
-        return custom_tags.get(ctx.command.qualified_name) and str(
-            ctx.guild.id
-        ) in custom_tags.get(ctx.command.qualified_name)
-
-    return commands.check(predicate)
-
-
 def to_seed(ctx: commands.Context) -> dict:
     """
     Grab seed from context return
@@ -64,6 +56,136 @@ def to_seed(ctx: commands.Context) -> dict:
     return seed
 
 
+def tag_blocks() -> List[tse.interface.Block]:
+    """
+    Every block tags can use, in the order the interpreter tries them
+    """
+    return [
+        tse.block.BreakBlock(),
+        tse.block.CommentBlock(),
+        tse.block.AllBlock(),
+        tse.block.AnyBlock(),
+        tse.block.IfBlock(),
+        tse.block.CountBlock(),
+        tse.block.LengthBlock(),
+        tse.block.BlacklistBlock(),
+        tse.block.CommandBlock(),
+        tse.block.CooldownBlock(),
+        tse.block.DeleteBlock(),
+        tse.block.EmbedBlock(),
+        tse.block.OverrideBlock(),
+        tse.block.ReactBlock(),
+        tse.block.RedirectBlock(),
+        tse.block.RequireBlock(),
+        tse.block.MathBlock(),
+        tse.block.OrdinalAbbreviationBlock(),
+        tse.block.RandomBlock(),
+        tse.block.RangeBlock(),
+        tse.block.PythonBlock(),
+        tse.block.ReplaceBlock(),
+        tse.block.StopBlock(),
+        tse.block.StrfBlock(),
+        tse.block.URLDecodeBlock(),
+        tse.block.URLEncodeBlock(),
+        tse.block.DebugBlock(),
+        tse.block.VarBlock(),
+        tse.block.LooseVariableGetterBlock(),
+    ]
+
+
+class TagTargets:
+    """
+    The roles, channels and users a requires or blacklist block points at,
+    resolved to ids so checking the author is only set lookups
+    """
+
+    __slots__ = ("roles", "channels", "users")
+
+    def __init__(
+        self,
+        roles: FrozenSet[int] = frozenset(),
+        channels: FrozenSet[int] = frozenset(),
+        users: FrozenSet[int] = frozenset(),
+    ) -> None:
+        """
+        roles: FrozenSet[int]
+            Role ids
+        channels: FrozenSet[int]
+            Channel ids
+        users: FrozenSet[int]
+            User ids
+        """
+        self.roles = roles
+        self.channels = channels
+        self.users = users
+
+    def required(self, ctx: commands.Context) -> bool:
+        """
+        Whether the author passes a requires block, every kind of target given
+        has to match
+        """
+        if self.roles and self.roles.isdisjoint(
+            role.id for role in getattr(ctx.author, "roles", ())
+        ):
+            return False
+        if self.channels and ctx.channel.id not in self.channels:
+            return False
+        if self.users and ctx.author.id not in self.users:
+            return False
+        return True
+
+    def blacklisted(self, ctx: commands.Context) -> bool:
+        """
+        Whether the author is caught by a blacklist block, any target matching
+        is enough
+        """
+        return (
+            ctx.author.id in self.users
+            or ctx.channel.id in self.channels
+            or not self.roles.isdisjoint(
+                role.id for role in getattr(ctx.author, "roles", ())
+            )
+        )
+
+
+def resolve_targets(
+    guild: Optional[discord.Guild], items: Tuple[str, ...]
+) -> TagTargets:
+    """
+    Resolve requires or blacklist items to ids from the guilds cache, trying
+    role, channel then member like the converters did but never hitting the API.
+    Items that don't resolve are ignored, ids that aren't a role or channel are
+    treated as user ids.
+    """
+    roles, channels, users = set(), set(), set()
+    if not guild:
+        return TagTargets()
+    for item in items:
+        match = ID_REGEX.match(item)
+        if match:
+            _id = int(match.group(1))
+            if guild.get_role(_id):
+                roles.add(_id)
+            elif guild.get_channel(_id):
+                channels.add(_id)
+            else:
+                users.add(_id)
+            continue
+
+        role = discord.utils.get(guild.roles, name=item)
+        if role:
+            roles.add(role.id)
+            continue
+        channel = discord.utils.get(guild.text_channels, name=item.lstrip("#"))
+        if channel:
+            channels.add(channel.id)
+            continue
+        member = guild.get_member_named(item)
+        if member:
+            users.add(member.id)
+    return TagTargets(frozenset(roles), frozenset(channels), frozenset(users))
+
+
 class Tag:
     """
     Tag class
@@ -77,6 +199,7 @@ class Tag:
         "created_at",
         "uses",
         "tagscript",
+        "targets",
     )
 
     def __init__(
@@ -88,6 +211,7 @@ class Tag:
         created_at: str,
         uses: int,
         tagscript: str,
+        targets: Optional[Dict[Tuple[str, ...], TagTargets]] = None,
     ) -> None:
         """
         tag_id: str
@@ -104,6 +228,9 @@ class Tag:
             How many times the tag's been used
         tagscript: str
             The tagscript
+        targets: Optional[Dict[Tuple[str, ...], TagTargets]]
+            Resolved requires and blacklist targets keyed by their items, None
+            until the tag is resolved
         """
         self.tag_id = tag_id
         self.guild = guild
@@ -112,6 +239,107 @@ class Tag:
         self.created_at = created_at
         self.uses = uses
         self.tagscript = tagscript
+        self.targets = targets
+
+
+class TagRegistry:
+    """
+    Every loaded tag indexed by (guild, name), plus a sorted list of names per
+    guild for listing and autocomplete
+    """
+
+    def __init__(self) -> None:
+        """
+        Init an empty registry
+        """
+        self.tags: Dict[Tuple[int, str], Tag] = {}
+        self.names: Dict[int, List[str]] = {}
+
+    def __len__(self) -> int:
+        """
+        Amount of tags loaded
+        """
+        return len(self.tags)
+
+    def get(self, guild: int, name: str) -> Optional[Tag]:
+        """
+        Get a guilds tag by name
+
+        Parameters
+        ----------
+        guild: int
+            The guild id
+        name: str
+            The tags name
+
+        Returns
+        -------
+        Optional[Tag]
+        """
+        return self.tags.get((int(guild), name))
+
+    def add(self, tag: Tag) -> None:
+        """
+        Add a tag, replacing the guilds tag with the same name
+        """
+        key = (int(tag.guild), tag.name)
+        if key not in self.tags:
+            bisect.insort(self.names.setdefault(key[0], []), tag.name)
+        self.tags[key] = tag
+
+    def remove(self, tag: Tag) -> Optional[Tag]:
+        """
+        Remove a tag, returns it if it was loaded
+        """
+        key = (int(tag.guild), tag.name)
+        removed = self.tags.pop(key, None)
+        if removed:
+            names = self.names[key[0]]
+            names.pop(bisect.bisect_left(names, tag.name))
+            if not names:
+                del self.names[key[0]]
+        return removed
+
+    def drop_guild(self, guild: int) -> int:
+        """
+        Remove every tag a guild has, returns how many were removed
+        """
+        names = self.names.pop(int(guild), [])
+        for name in names:
+            del self.tags[(int(guild), name)]
+        return len(names)
+
+    def guild_tags(self, guild: int) -> List[Tag]:
+        """
+        Get every tag a guild has, sorted by name
+        """
+        guild = int(guild)
+        return [self.tags[(guild, name)] for name in self.names.get(guild, ())]
+
+    def complete(self, guild: int, current: str, limit: int = 25) -> List[str]:
+        """
+        Get up to limit of a guilds tag names starting with current
+
+        Parameters
+        ----------
+        guild: int
+            The guild id
+        current: str
+            What's been typed so far
+        limit: int
+            The most names to return
+
+        Returns
+        -------
+        List[str]
+        """
+        names = self.names.get(int(guild), [])
+        matches = []
+        for index in range(bisect.bisect_left(names, current), len(names)):
+            if len(matches) == limit or not names[index].startswith(current):
+                break
+            matches.append(names[index])
+        return matches
 
 
 class Tags(commands.Cog):
@@ -122,7 +350,6 @@ class Tags(commands.Cog):
     COLOR = style.Color.ORANGE
     ICON = "<:_:992082395748634724>"
 
-    custom_tags: dict = {}
     latest_tag: int = None
 
     def __init__(self, bot: commands.Bot) -> None:
@@ -131,42 +358,21 @@ class Tags(commands.Cog):
         """
         self.bot = bot
         self.databases: BennyDatabases = bot.databases
-        bot.custom_tags = self.custom_tags
-        tse_blocks = [
-            tse.block.BreakBlock(),
-            tse.block.CommentBlock(),
-            tse.block.AllBlock(),
-            tse.block.AnyBlock(),
-            tse.block.IfBlock(),
-            tse.block.CountBlock(),
-            tse.block.LengthBlock(),
-            tse.block.BlacklistBlock(),
-            tse.block.CommandBlock(),
-            tse.block.CooldownBlock(),
-            tse.block.DeleteBlock(),
-            tse.block.EmbedBlock(),
-            tse.block.OverrideBlock(),
-            tse.block.ReactBlock(),
-            tse.block.RedirectBlock(),
-            tse.block.RequireBlock(),
-            tse.block.MathBlock(),
-            tse.block.OrdinalAbbreviationBlock(),
-            tse.block.RandomBlock(),
-            tse.block.RangeBlock(),
-            tse.block.PythonBlock(),
-            tse.block.ReplaceBlock(),
-            tse.block.StopBlock(),
-            tse.block.StrfBlock(),
-            tse.block.URLDecodeBlock(),
-            tse.block.URLEncodeBlock(),
-            tse.block.DebugBlock(),
-            tse.block.VarBlock(),
-            tse.block.LooseVariableGetterBlock(),
-        ]
-        self.tsei = tse.interpreter.AsyncInterpreter(blocks=tse_blocks)
+        self.tags = TagRegistry()
+        bot.custom_tags = self.tags
+        options = bot.config.get("Tags", {})
+        self.tsei = ProfilingInterpreter(tag_blocks())
+        self.profile_blocks: bool = options.get("ProfileBlocks", False)
+        self.pending_uses: Dict[str, int] = {}
+        self.flush_interval: float = options.get("UseFlushInterval", 5.0)
+        self.last_flush: float = None
+        self.writing: Optional[asyncio.Future] = None
+        self.lazy: bool = options.get("Lazy", False)
+        self.lazy_guilds: int = options.get("LazyGuilds", 1000)
+        self.lazy_idle: float = options.get("LazyIdle", 1800)
+        self.loaded_guilds: OrderedDict = OrderedDict()
+        self.loading: Dict[int, asyncio.Task] = {}
         self.channel_converter = commands.TextChannelConverter()
-        self.member_converter = commands.MemberConverter()
-        self.role_converter = commands.RoleConverter()
 
     async def cog_load(self) -> None:
         """
@@ -186,10 +392,20 @@ class Tags(commands.Cog):
             );
             """
         )
+        await self.databases.servers.execute(
+            """
+            CREATE INDEX IF NOT EXISTS tags_tags_guild_name ON tags_tags (
+                guild,
+                name
+            );
+            """
+        )
         await self.databases.servers.commit()
 
         async with self.databases.servers.cursor() as cursor:
-            row = await cursor.execute("""SELECT MAX(tag_id) FROM tags_tags;""")
+            row = await cursor.execute(
+                """SELECT MAX(CAST(tag_id AS INTEGER)) FROM tags_tags;"""
+            )
             _max = tuple(await row.fetchone())[0]
             if _max:
                 self.latest_tag = int(_max)
@@ -198,17 +414,166 @@ class Tags(commands.Cog):
 
         await self.bot.terminal.load(f"Loaded tags up to {self.latest_tag}")
 
+        self.flush_uses.change_interval(seconds=self.flush_interval)
+        self.flush_uses.start()
+        if self.lazy:
+            self.evict_idle_guilds.start()
+
     async def cog_unload(self) -> None:
         """
-        On cog unload close our db
+        On cog unload stop the flush loop and write out any uses we're still holding,
+        this also runs on shutdown since the bot removes every cog before closing
+        """
+        self.flush_uses.cancel()
+        self.evict_idle_guilds.cancel()
+        if self.writing and not self.writing.done():
+            # Cancelling the loop doesn't stop a write it started, let it land
+            # (or hand its deltas back) before the final flush
+            await asyncio.wait([self.writing])
+        await self.write_uses()
+
+    @tasks.loop(minutes=1.0)
+    async def evict_idle_guilds(self) -> None:
+        """
+        In lazy mode, drop the tags of guilds that haven't used them in a while
+        """
+        now = time.monotonic()
+        while self.loaded_guilds:
+            guild, last_used = next(iter(self.loaded_guilds.items()))
+            if now - last_used < self.lazy_idle:
+                break
+            self.unload_guild(guild)
+
+    async def ensure_guild(self, guild: int) -> None:
+        """
+        In lazy mode, make sure a guilds tags are loaded, every caller for a guild
+        that's still loading waits on the same query
+
+        Parameters
+        ----------
+        guild: int
+            The guild id
+        """
+        if not self.lazy:
+            return
+        guild = int(guild)
+        if guild in self.loaded_guilds:
+            self.loaded_guilds[guild] = time.monotonic()
+            self.loaded_guilds.move_to_end(guild)
+            return
+        pending = self.loading.get(guild)
+        if pending is None:
+            pending = self.loading[guild] = asyncio.ensure_future(
+                self.load_guild(guild)
+            )
+            pending.add_done_callback(lambda _: self.loading.pop(guild, None))
+        await asyncio.shield(pending)
+
+    async def load_guild(self, guild: int) -> None:
+        """
+        Load a single guilds tags into the registry, evicting the least recently
+        used guild if we're holding too many
+        """
+        for tag in await self.get_tags(str(guild)):
+            tag.uses += self.pending_uses.get(str(tag.tag_id), 0)
+            self.tags.add(tag)
+        self.loaded_guilds[guild] = time.monotonic()
+        while len(self.loaded_guilds) > self.lazy_guilds:
+            self.unload_guild(next(iter(self.loaded_guilds)))
+
+    def unload_guild(self, guild: int) -> None:
+        """
+        Forget a guilds tags, they'll be loaded again on next use
+        """
+        self.loaded_guilds.pop(guild, None)
+        self.tags.drop_guild(guild)
+
+    async def get_tag(self, guild: int, name: str) -> Optional[Tag]:
+        """
+        Get a guilds tag by name, loading the guilds tags first in lazy mode
+
+        Parameters
+        ----------
+        guild: int
+            The guild id
+        name: str
+            The tags name
+
+        Returns
+        -------
+        Optional[Tag]
+        """
+        await self.ensure_guild(guild)
+        return self.tags.get(guild, name)
+
+    @tasks.loop(seconds=5.0)
+    async def flush_uses(self) -> None:
+        """
+        Write pending tag uses every flush interval
+        """
+        try:
+            await self.write_uses()
+        except Exception as e:  # pylint: disable=broad-except
+            self.bot.dispatch("log_error", f"Failed to flush tag uses: {e}")
+
+    async def write_uses(self) -> int:
         """
-        # await self.db.close()
+        Write every pending use delta with a single statement, on failure the
+        deltas go back to pending so the next flush tries again
+
+        The write itself is shielded, cancelling a flush leaves it running and it
+        still hands its deltas back if it fails.
+
+        Returns
+        -------
+        int
+            How many uses were written
+        """
+        if not self.pending_uses:
+            return 0
+        pending, self.pending_uses = self.pending_uses, {}
+        self.writing = asyncio.ensure_future(self.update_uses(pending))
+        self.writing.add_done_callback(
+            lambda write: self.restore_uses(pending)
+            if write.cancelled() or write.exception()
+            else None
+        )
+        await asyncio.shield(self.writing)
+        self.last_flush = time.time()
+        return sum(pending.values())
+
+    async def update_uses(self, pending: Dict[str, int]) -> None:
+        """
+        Add use deltas to their tags, one statement so it's atomic by itself and
+        can't get caught up in anything else on the connection
+        """
+        await self.databases.servers.execute(
+            """
+            UPDATE tags_tags SET uses = uses + deltas.value
+            FROM json_each(?) AS deltas
+            WHERE tags_tags.tag_id = deltas.key;
+            """,
+            (json.dumps(pending),),
+        )
+
+    def restore_uses(self, pending: Dict[str, int]) -> None:
+        """
+        Put deltas that failed to write back into pending
+        """
+        for tag_id, delta in pending.items():
+            self.pending_uses[tag_id] = self.pending_uses.get(tag_id, 0) + delta
 
     @commands.Cog.listener()
     async def on_initiate_all_tags(self) -> None:
         """
-        Initiate all tags.
+        Initiate all tags, in lazy mode they're loaded per guild on first use instead
         """
+        if self.lazy:
+            await self.bot.terminal.load(
+                f"Lazy tag loading for up to {self.lazy_guilds} guilds"
+            )
+            return
+
         start = time.monotonic()
         async with self.databases.servers.cursor() as cursor:
             row = await cursor.execute("""SELECT * FROM tags_tags;""")
@@ -222,59 +587,42 @@ class Tags(commands.Cog):
 
         total_load = (round((end - start) * 1000, 2)) / 1000
         await self.bot.terminal.load(
-            f"Loaded {self.latest_tag} tags in {total_load} seconds."
+            f"Loaded {len(self.tags)} tags in {total_load} seconds."
         )
 
     async def create_tag(self, tag: Tag) -> None:
         """
         Initiate a tag by adding it to the bot and everything
         """
-        existing_command = self.custom_tags.get(tag.name)
-
-        if not existing_command and self.bot.get_command(tag.name):
+        if self.bot.get_command(tag.name):
             raise commands.BadArgument(
                 "Not sure how you got here... This shouldn't happen, a command already exists internally in the bot"
             )
 
-        if existing_command:
-            self.custom_tags[tag.name][tag.guild] = tag
-
-        else:
-            self.custom_tags[tag.name] = {tag.guild: tag}
-            self.latest_tag += 1
+        self.tags.add(tag)
 
     async def remove_tag(self, tag: Tag) -> None:
         """
         Officially delete the tag.
         """
-        if (
-            tag.name not in self.custom_tags
-            or tag.guild not in self.custom_tags[tag.name]
-        ):
-            raise commands.BadArgument(f"There isn't a custom tag called {self.name}")
-        del self.custom_tags[tag.name][tag.guild]
+        if not self.tags.remove(tag):
+            raise commands.BadArgument(f"There isn't a custom tag called {tag.name}")
         await self.databases.servers.execute(
             """DELETE FROM tags_tags WHERE tag_id = ?;""", (tag.tag_id,)
         )
         await self.databases.servers.commit()
 
-    async def use_tag(self, tag: Tag) -> None:
+    def use_tag(self, tag: Tag) -> None:
         """
-        Use a tag by adding to its counter
+        Use a tag by adding to its counter, the database catches up on the next flush
         """
         tag.uses += 1
-
-        await asyncio.gather(
-            self.databases.servers.execute(
-                """UPDATE tags_tags SET uses = ? WHERE tag_id = ?;""",
-                (tag.uses, tag.tag_id),
-            ),
-            self.databases.servers.commit(),
-        )
+        tag_id = str(tag.tag_id)
+        self.pending_uses[tag_id] = self.pending_uses.get(tag_id, 0) + 1
 
     async def get_tags(self, guild: str) -> List[Tag]:
         """
-        Get all a servers tags in a list
+        Get all a servers tags in a list, straight from the database
 
         Returns all of them as a Tag class
         """
@@ -306,8 +654,58 @@ class Tags(commands.Cog):
         else:
             await dest.send(body if body else None, embeds=embeds)
 
+    def resolve_tag(
+        self, tag: Tag, guild: Optional[discord.Guild]
+    ) -> Dict[Tuple[str, ...], TagTargets]:
+        """
+        Resolve the targets of every requires and blacklist block in a tag whose
+        parameter doesn't depend on other blocks
+
+        Parameters
+        ----------
+        tag: Tag
+            The tag
+        guild: Optional[discord.Guild]
+            The guild the tag belongs to
+
+        Returns
+        -------
+        Dict[Tuple[str, ...], TagTargets]
+            Targets keyed by the items the block will produce
+        """
+        targets = {}
+        for node in tse.build_node_tree(tag.tagscript):
+            start, end = node.coordinates
+            verb = tse.Verb(tag.tagscript[start : end + 1])
+            if (
+                verb.declaration
+                and verb.declaration.lower() in TARGET_BLOCKS
+                and verb.parameter
+                and "{" not in verb.parameter
+            ):
+                items = tuple(i.strip() for i in verb.parameter.split(","))
+                targets[items] = resolve_targets(guild, items)
+        return targets
+
+    def get_targets(
+        self, tag: Tag, guild: Optional[discord.Guild], items: List[str]
+    ) -> TagTargets:
+        """
+        Get the resolved targets for a requires or blacklist block, tags loaded
+        from the database are resolved on their first run. Parameters built by
+        other blocks can't be known ahead of time so they're resolved every run.
+        """
+        if tag.targets is None:
+            tag.targets = self.resolve_tag(tag, guild)
+        items = tuple(items)
+        targets = tag.targets.get(items)
+        if targets is None:
+            targets = resolve_targets(guild, items)
+        return targets
+
     async def handle_actions(
         self,
+        tag: Tag,
         actions: Dict[str, Any],
         ctx: commands.Context,
         embeds: List[discord.Embed],
@@ -333,76 +731,17 @@ class Tags(commands.Cog):
             elif action == "override":
                 can_send = value.get("permissions")
             elif action == "requires":
-                for i in action["items"]:
-                    roles = []
-                    channels = []
-                    members = []
-                    try:
-                        roles.append(await self.role_converter.convert(ctx, i))
-                    except commands.RoleNotFound:
-                        try:
-                            channels.append(
-                                await self.channel_converter.convert(ctx, i)
-                            )
-                        except commands.ChannelNotFound:
-                            try:
-                                members.append(
-                                    await self.member_converter.convert(ctx, i)
-                                )
-                            except commands.MemberNotFound:
-                                pass
-
-                send_require = True
-                if roles:
-                    if not any(role.id in ctx.author.roles for role in roles):
-                        send_require = False
-                        can_send = False
-                if channels:
-                    if ctx.channel not in channels:
-                        send_require = False
-                        can_send = False
-                if members:
-                    if not any(member.id in ctx.author.id for member in members):
-                        send_require = False
-                        can_send = False
-                if send_require:
-                    await ctx.send(action["response"])
-
+                targets = self.get_targets(tag, ctx.guild, value["items"])
+                if not targets.required(ctx):
+                    can_send = False
+                    if value["response"]:
+                        await ctx.send(value["response"])
             elif action == "blacklist":
-                for i in action["items"]:
-                    roles = []
-                    channels = []
-                    members = []
-                    try:
-                        roles.append(await self.role_converter.convert(ctx, i))
-                    except commands.RoleNotFound:
-                        try:
-                            channels.append(
-                                await self.channel_converter.convert(ctx, i)
-                            )
-                        except commands.ChannelNotFound:
-                            try:
-                                members.append(
-                                    await self.member_converter.convert(ctx, i)
-                                )
-                            except commands.MemberNotFound:
-                                pass
-
-                send_blacklist = False
-                if roles:
-                    if any(role.id in ctx.author.roles for role in roles):
-                        send_blacklist = True
-                        can_send = False
-                if channels:
-                    if ctx.channel in channels:
-                        send_blacklist = True
-                        can_send = False
-                if members:
-                    if any(member.id in ctx.author.id for member in members):
-                        send_blacklist = True
-                        can_send = False
-                if send_blacklist:
-                    await ctx.send(action["response"])
+                targets = self.get_targets(tag, ctx.guild, value["items"])
+                if targets.blacklisted(ctx):
+                    can_send = False
+                    if value["response"]:
+                        await ctx.send(value["response"])
         return can_send
 
     async def handle_debug(
@@ -413,11 +752,12 @@ class Tags(commands.Cog):
         embeds: List[discord.Embed],
         start: int,
         end: int,
+        profile: Optional[Dict[str, BlockTiming]] = None,
     ) -> None:
         """
         Handle a custom commands debug, should only be used with invoke_custom_command
         """
-        debug = ""
+        debug_values = ""
         defaults = ""
 
         debug.update(
@@ -437,10 +777,10 @@ class Tags(commands.Cog):
             if k in FAKE_SEED:
                 defaults += f"{clean(k)}: {clean(v)}\n"
             else:
-                debug += f"{clean(k)}: {clean(v)}\n"
+                debug_values += f"{clean(k)}: {clean(v)}\n"
 
         debug_c = f"""```yaml
-{debug.strip()}         
+{debug_values.strip()}
 ```"""
         defaults_c = f"""```yaml
 {defaults.strip()}
@@ -452,10 +792,16 @@ class Tags(commands.Cog):
             timestamp=discord.utils.utcnow(),
             color=style.Color.random(),
         )
-        if debug:
+        if debug_values:
             dembed.add_field(name="Debug Values", value=debug_c, inline=False)
         if defaults:
             dembed.add_field(name="Default Values", value=defaults_c, inline=False)
+        if profile:
+            dembed.add_field(
+                name="Slowest Blocks",
+                value=f"```yaml\n{render_profile(profile)}\n```",
+                inline=False,
+            )
         embeds.append(dembed)
 
     async def invoke_custom_command(
@@ -465,14 +811,18 @@ class Tags(commands.Cog):
         Invoke a custom command
         """
         if use:
-            self.bot.loop.create_task(self.use_tag(tag))
+            self.use_tag(tag)
 
         seeds = {}
         seeds.update({"args": tse.StringAdapter(args)})
         seeds.update(to_seed(ctx))
 
         start = time.monotonic()
-        response = await self.tsei.process(message=tag.tagscript, seed_variables=seeds)
+        response = await self.tsei.process(
+            tag.tagscript,
+            seed_variables=seeds,
+            profile=self.profile_blocks,
+        )
         end = time.monotonic()
 
         dest = None
@@ -480,11 +830,17 @@ class Tags(commands.Cog):
         can_send = True
 
         if response.actions:
-            can_send = await self.handle_actions(response.actions, ctx, embeds)
+            can_send = await self.handle_actions(tag, response.actions, ctx, embeds)
 
         if response.extras.get("debug"):
             await self.handle_debug(
-                ctx, tag, response.extras.get("debug"), embeds, start, end
+                ctx,
+                tag,
+                response.extras.get("debug"),
+                embeds,
+                start,
+                end,
+                response.extras.get("profile"),
             )
 
         if can_send:
@@ -541,16 +897,12 @@ class Tags(commands.Cog):
         """
         Create a new tag
         """
-        guild_tags = self.custom_tags.get(name)
-        tag = None
-        if guild_tags:
-            tag = guild_tags.get(str(ctx.guild.id))
+        tag = await self.get_tag(ctx.guild.id, name)
 
-        for x in self.bot.commands:
-            if x.name == name and name not in self.custom_tags:
-                raise commands.BadArgument(
-                    f"A command with the name {name} already exists. Please choose a different name."
-                )
+        if self.bot.get_command(name):
+            raise commands.BadArgument(
+                f"A command with the name {name} already exists. Please choose a different name."
+            )
 
         if tag:
             await self.databases.servers.execute(
@@ -559,7 +911,7 @@ class Tags(commands.Cog):
             )
             await self.databases.servers.commit()
             new_tag = Tag(
-                self.latest_tag,
+                tag.tag_id,
                 str(ctx.guild.id),
                 name,
                 tag.creator,
@@ -567,7 +919,8 @@ class Tags(commands.Cog):
                 tag.uses,
                 content,
             )
-            guild_tags[str(ctx.guild.id)] = new_tag
+            new_tag.targets = self.resolve_tag(new_tag, ctx.guild)
+            self.tags.add(new_tag)
 
             embed = discord.Embed(
                 title="Success",
@@ -603,6 +956,7 @@ class Tags(commands.Cog):
                 tag_data[5],
                 tag_data[6],
             )
+            tag_mod.targets = self.resolve_tag(tag_mod, ctx.guild)
             await self.create_tag(tag_mod)
 
             embed = discord.Embed(
@@ -628,19 +982,31 @@ class Tags(commands.Cog):
         """
         Delete a tag
         """
-        commands_named = self.custom_tags.get(name.lower())
+        tag = await self.get_tag(ctx.guild.id, name.lower())
+        if tag:
+            await self.remove_tag(tag)
+            embed = discord.Embed(
+                title="Success",
+                description=f"""Removed tag `{name.lower()}`""",
+                timestamp=discord.utils.utcnow(),
+                color=style.Color.RED,
+            )
+            await ctx.send(embed=embed)
 
-        if commands_named:
-            tag = commands_named.get(str(ctx.guild.id))
-            if tag:
-                await self.remove_tag(tag)
-                embed = discord.Embed(
-                    title="Success",
-                    description=f"""Removed tag `{name.lower()}`""",
-                    timestamp=discord.utils.utcnow(),
-                    color=style.Color.RED,
-                )
-                await ctx.send(embed=embed)
+    @tag_remove_cmd.autocomplete("name")
+    async def tag_name_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> List[app_commands.Choice[str]]:
+        """
+        Autocomplete a guilds tag names
+        """
+        if interaction.guild_id is None:
+            return []
+        await self.ensure_guild(interaction.guild_id)
+        return [
+            app_commands.Choice(name=name, value=name)
+            for name in self.tags.complete(interaction.guild_id, current)
+        ]
 
     @tag_group.command(
         name="list",
@@ -656,7 +1022,8 @@ class Tags(commands.Cog):
         """
         Display all of a servers tags
         """
-        tags = await self.get_tags(str(ctx.guild.id))
+        await self.ensure_guild(ctx.guild.id)
+        tags = self.tags.guild_tags(ctx.guild.id)
 
         vis_list = []
 
@@ -1,4 +1,5 @@
 import time
+from typing import Dict, Tuple
 
 import asqlite
 import discord
@@ -21,22 +22,35 @@ class AFKManager:
         self.bot = bot
         self.pcc = bot.pcc  # premium stuff, not done smh
         self.database = database
+        self.afks: Dict[Tuple[int, int], Tuple[str, int]] = {}
+
+    async def load(self) -> None:
+        """
+        Load every afk into memory, keyed by (guild, user) to (message, unix) so
+        messages can be checked without touching the db
+        """
+        async with self.database.cursor() as cursor:
+            await cursor.execute("SELECT guild, user, message, unix FROM base_afk;")
+            rows = await cursor.fetchall()
+        self.afks = {(row[0], row[1]): (row[2], row[3]) for row in rows}
 
     async def set_afk(self, ctx: commands.Context, message: str) -> None:
         """
         Set an afk for a user in a certain guild
         """
+        unix = int(time.time())
         async with self.database.cursor() as cursor:
             await cursor.execute(
                 "REPLACE INTO base_afk VALUES (?, ?, ?, ?);",
                 (
-                    str(ctx.message.guild.id),
-                    str(ctx.author.id),
+                    ctx.message.guild.id,
+                    ctx.author.id,
                     message,
-                    int(time.time()),
+                    unix,
                 ),
             )
             await self.database.commit()
+        self.afks[(ctx.message.guild.id, ctx.author.id)] = (message, unix)
 
         embed = discord.Embed(
             title="Set AFK",
@@ -55,10 +69,11 @@ class AFKManager:
         Delete an afk from the db, usually called when a user has sent a message showing that they
         aren't actually afk
         """
+        self.afks.pop((guild, user), None)
         async with self.database.cursor() as cursor:
             await cursor.execute(
                 "DELETE FROM base_afk WHERE guild = ? AND user = ?;",
-                (str(guild), str(user)),
+                (guild, user),
             )
             await self.database.commit()
 
@@ -66,41 +81,29 @@ class AFKManager:
         """
         Manage an afk when it gets sent here, first check if its a message from a user
         """
-        async with self.database.cursor() as cursor:
-            await cursor.execute(
-                "SELECT * FROM base_afk WHERE guild = ? AND user = ?;",
-                (str(message.guild.id), str(message.author.id)),
-            )
-            afk_data = await cursor.fetchone()
-            if afk_data:
-                if afk_data[3] + 3 < int(time.time()):
-                    await self.del_afk(message.guild.id, message.author.id)
-                    embed = discord.Embed(
-                        title="Removed AFK",
-                        description=f"""Welcome back {message.author.mention}!
+        guild = message.guild.id
+        afk_data = self.afks.get((guild, message.author.id))
+        if afk_data and afk_data[1] + 3 < int(time.time()):
+            await self.del_afk(guild, message.author.id)
+            embed = discord.Embed(
+                title="Removed AFK",
+                description=f"""Welcome back {message.author.mention}!
 
-                        You've been afk since <t:{afk_data[3]}:R>""",
-                        timestamp=discord.utils.utcnow(),
-                        color=style.Color.PINK,
-                    )
-                    await message.reply(embed=embed)
+                You've been afk since <t:{afk_data[1]}:R>""",
+                timestamp=discord.utils.utcnow(),
+                color=style.Color.PINK,
+            )
+            await message.reply(embed=embed)
 
-            for mention in message.mentions[:3]:
-                if not message.author.id == mention.id:
-                    await cursor.execute(
-                        "SELECT * FROM base_afk WHERE guild = ? AND user = ?;",
-                        (str(message.guild.id), str(mention.id)),
-                    )
-                    afk_data = await cursor.fetchone()
-                    username = (
-                        self.bot.get_user(mention.id)
-                        or (await self.bot.fetch_user(mention.id))
-                    ).name
-                    if afk_data:
-                        embed = discord.Embed(
-                            title=f"{username} is AFK",
-                            description=afk_data[2],
-                            timestamp=discord.utils.utcnow(),
-                            color=style.Color.PINK,
-                        )
-                        await message.channel.send(embed=embed)
+        for mention in message.mentions[:3]:
+            if message.author.id == mention.id:
+                continue
+            afk_data = self.afks.get((guild, mention.id))
+            if afk_data:
+                embed = discord.Embed(
+                    title=f"{mention.name} is AFK",
+                    description=afk_data[0],
+                    timestamp=discord.utils.utcnow(),
+                    color=style.Color.PINK,
+                )
+                await message.channel.send(embed=embed)
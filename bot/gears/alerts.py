@@ -0,0 +1,329 @@
+"""
+Queue and coalesce sentinel alerts so raids don't get our webhooks rate limited
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+import aiohttp
+import discord
+
+__all__ = ("TokenBucket", "AlertDispatcher")
+
+
+class TokenBucket:
+    """
+    Simple token bucket, rate tokens refilled every per seconds
+    """
+
+    __slots__ = ("rate", "per", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, per: float) -> None:
+        """
+        Init a full bucket
+        """
+        self.rate = rate
+        self.per = per
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def refill(self, now: float) -> None:
+        """
+        Refill tokens for the time that's passed
+        """
+        self.tokens = min(
+            self.rate, self.tokens + (now - self.updated) * self.rate / self.per
+        )
+        self.updated = now
+
+    def ready(self, now: float) -> bool:
+        """
+        Check if we can take a token right now
+        """
+        self.refill(now)
+        return now >= self.blocked_until and self.tokens >= 1
+
+    def take(self) -> None:
+        """
+        Take a token
+        """
+        self.tokens -= 1
+
+    def block(self, now: float, seconds: float) -> None:
+        """
+        Stop handing out tokens for a while, used when discord tells us to back off
+        """
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class PendingAlert:
+    """
+    An alert waiting to be sent, possibly standing in for several
+    """
+
+    __slots__ = ("author_id", "embed", "count")
+
+    def __init__(self, author_id: int, embed: discord.Embed) -> None:
+        """
+        Init the alert
+        """
+        self.author_id = author_id
+        self.embed = embed
+        self.count = 1
+
+    def render(self, window: float) -> discord.Embed:
+        """
+        Get the embed to send, noting how many alerts it collapsed
+        """
+        if self.count == 1:
+            return self.embed
+        embed = self.embed.copy()
+        embed.title = f"{embed.title} (x{self.count})"
+        embed.set_footer(
+            text=f"Collapsed {self.count} alerts from this user within {window} seconds, showing the latest"
+        )
+        return embed
+
+
+class GuildAlerts:
+    """
+    Alert state for a single guilds webhook
+    """
+
+    __slots__ = ("url", "queue", "held", "last_sent", "bucket")
+
+    def __init__(self, url: str, rate: float, per: float) -> None:
+        """
+        Init the guilds state
+        """
+        self.url = url
+        self.queue: OrderedDict = OrderedDict()
+        self.held: Dict[int, PendingAlert] = {}
+        self.last_sent: Dict[int, float] = {}
+        self.bucket = TokenBucket(rate, per)
+
+
+class AlertDispatcher:
+    """
+    Per guild alert queues sent by a single worker
+
+    Alerts from the same author inside window seconds collapse into one summary,
+    queued alerts go out up to 10 embeds per webhook call, and every webhook has a
+    token bucket that also backs off when discord hands us a 429.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        window: float = 30,
+        rate: float = 5,
+        per: float = 2,
+    ) -> None:
+        """
+        Init the dispatcher
+
+        Parameters
+        ----------
+        session: aiohttp.ClientSession
+            Session our webhooks use
+        window: float
+            Seconds during which repeat alerts for an author are collapsed
+        rate: float
+            Webhook calls allowed every per seconds
+        per: float
+            See rate
+        """
+        self.session = session
+        self.window = window
+        self.rate = rate
+        self.per = per
+        self.guilds: Dict[int, GuildAlerts] = {}
+        self.webhooks: Dict[str, discord.Webhook] = {}
+        self.wakeup = asyncio.Event()
+        self.worker: asyncio.Task = None
+        self.metrics: Dict[str, int] = {
+            "submitted": 0,
+            "collapsed": 0,
+            "embeds sent": 0,
+            "webhook calls": 0,
+            "rate limited": 0,
+            "retried": 0,
+            "failed": 0,
+        }
+
+    def start(self) -> None:
+        """
+        Start the worker if it isn't already running
+        """
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.get_running_loop().create_task(self.run())
+
+    async def close(self) -> None:
+        """
+        Stop the worker
+        """
+        if self.worker:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+    def webhook(self, url: str) -> discord.Webhook:
+        """
+        Get a webhook, reusing the same object for the same url
+        """
+        webhook = self.webhooks.get(url)
+        if webhook is None:
+            webhook = self.webhooks[url] = discord.Webhook.from_url(
+                url=url, session=self.session
+            )
+        return webhook
+
+    def submit(
+        self, guild_id: int, url: str, author_id: int, embed: discord.Embed
+    ) -> None:
+        """
+        Queue an alert to be sent
+
+        Parameters
+        ----------
+        guild_id: int
+            The guild the alert is for
+        url: str
+            The guilds sentinel webhook url
+        author_id: int
+            The author who triggered the alert
+        embed: discord.Embed
+            The alert itself
+        """
+        self.metrics["submitted"] += 1
+        guild = self.guilds.get(guild_id)
+        if guild is None:
+            guild = self.guilds[guild_id] = GuildAlerts(url, self.rate, self.per)
+        guild.url = url
+
+        pending = guild.queue.get(author_id) or guild.held.get(author_id)
+        if pending:
+            pending.count += 1
+            pending.embed = embed
+            self.metrics["collapsed"] += 1
+        elif (
+            author_id in guild.last_sent
+            and time.monotonic() - guild.last_sent[author_id] < self.window
+        ):
+            guild.held[author_id] = PendingAlert(author_id, embed)
+        else:
+            guild.queue[author_id] = PendingAlert(author_id, embed)
+        self.start()
+        self.wakeup.set()
+
+    async def run(self) -> None:
+        """
+        Worker loop, wakes up on new alerts or every second to release held ones
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await asyncio.gather(*(self.flush(guild) for guild in self.guilds.values()))
+            self.prune()
+
+    def prune(self) -> None:
+        """
+        Forget guilds with nothing queued, held or recently sent, and any webhook
+        no guild uses anymore
+        """
+        idle = [
+            guild_id
+            for guild_id, guild in self.guilds.items()
+            if not (guild.queue or guild.held or guild.last_sent)
+        ]
+        if not idle:
+            return
+        for guild_id in idle:
+            del self.guilds[guild_id]
+        urls = {guild.url for guild in self.guilds.values()}
+        for url in [url for url in self.webhooks if url not in urls]:
+            del self.webhooks[url]
+
+    def requeue(self, guild: GuildAlerts, batch: List[PendingAlert]) -> None:
+        """
+        Put a batch back at the front of a guilds queue
+        """
+        for pending in reversed(batch):
+            guild.queue[pending.author_id] = pending
+            guild.queue.move_to_end(pending.author_id, last=False)
+
+    async def flush(self, guild: GuildAlerts) -> None:
+        """
+        Send everything we can for a guild right now
+        """
+        now = time.monotonic()
+        for author_id, last_sent in list(guild.last_sent.items()):
+            if now - last_sent >= self.window:
+                del guild.last_sent[author_id]
+                held = guild.held.pop(author_id, None)
+                if held:
+                    guild.queue[author_id] = held
+
+        while guild.queue and guild.bucket.ready(time.monotonic()):
+            batch: List[PendingAlert] = []
+            size = 0
+            for pending in guild.queue.values():
+                length = len(pending.embed) + 200
+                if len(batch) == 10 or (batch and size + length > 6000):
+                    break
+                batch.append(pending)
+                size += length
+            for pending in batch:
+                del guild.queue[pending.author_id]
+
+            guild.bucket.take()
+            try:
+                await self.webhook(guild.url).send(
+                    embeds=[pending.render(self.window) for pending in batch]
+                )
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    self.metrics["rate limited"] += 1
+                    headers = e.response.headers
+                    retry_after = headers.get("Retry-After") or headers.get(
+                        "X-RateLimit-Reset-After", self.per
+                    )
+                    guild.bucket.block(time.monotonic(), float(retry_after))
+                    self.requeue(guild, batch)
+                    return
+                self.metrics["failed"] += len(batch)
+                continue
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                # Connection trouble, not the webhook, so keep the alerts and try
+                # again once the bucket lets us
+                self.metrics["retried"] += len(batch)
+                guild.bucket.block(time.monotonic(), self.per)
+                self.requeue(guild, batch)
+                return
+
+            self.metrics["webhook calls"] += 1
+            self.metrics["embeds sent"] += len(batch)
+            sent = time.monotonic()
+            for pending in batch:
+                guild.last_sent[pending.author_id] = sent
+
+    def stats(self) -> str:
+        """
+        Readable stats for the dev command
+        """
+        queued = sum(len(guild.queue) for guild in self.guilds.values())
+        held = sum(len(guild.held) for guild in self.guilds.values())
+        lines = [f"{key}: {value}" for key, value in self.metrics.items()]
+        lines.append(f"queued: {queued} | held: {held}")
+        lines.append(f"guilds: {len(self.guilds)} | webhooks: {len(self.webhooks)}")
+        return "\n".join(lines)
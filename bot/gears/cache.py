@@ -0,0 +1,172 @@
+"""
+Small bounded caches we use to avoid repeating expensive work
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+__all__ = ("LRUCache",)
+
+
+class LRUCache:
+    """
+    A size bounded least recently used cache with an optional time to live
+
+    Attributes
+    ----------
+    maxsize: int
+        The most entries we keep before evicting the oldest
+    ttl: Optional[float]
+        Seconds an entry stays valid for, None to keep entries until evicted
+    hits: int
+        Lookups that found a valid entry
+    misses: int
+        Lookups that didn't
+    evictions: int
+        Entries dropped because the cache was full or they expired
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        """
+        Init the cache
+
+        Parameters
+        ----------
+        maxsize: int
+            The most entries we keep
+        ttl: Optional[float]
+            Seconds an entry stays valid for
+        """
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        self.entries: OrderedDict = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        """
+        Amount of entries, including any that expired but haven't been touched
+        """
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """
+        Check if a key is cached without counting a hit or miss
+        """
+        entry = self.entries.get(key)
+        return entry is not None and not self.expired(entry[0])
+
+    def expired(self, stored: float) -> bool:
+        """
+        Check if an entry stored at stored has expired
+        """
+        return self.ttl is not None and time.monotonic() - stored > self.ttl
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get a value, marking it as recently used
+
+        Parameters
+        ----------
+        key: Hashable
+            The key to look up
+        default: Any
+            What to return if the key isn't cached
+
+        Returns
+        -------
+        Any
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if self.expired(entry[0]):
+            del self.entries[key]
+            self.evictions += 1
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Cache a value, evicting the least recently used entry if we're full
+
+        Parameters
+        ----------
+        key: Hashable
+            The key to store under
+        value: Any
+            The value to store
+        """
+        self.entries[key] = (time.monotonic(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove a key and return its value
+        """
+        entry = self.entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def expire(self) -> int:
+        """
+        Remove every entry that has expired, returns how many were removed
+        """
+        if self.ttl is None:
+            return 0
+        expired = [key for key, entry in self.entries.items() if self.expired(entry[0])]
+        for key in expired:
+            del self.entries[key]
+        self.evictions += len(expired)
+        return len(expired)
+
+    def clear(self) -> int:
+        """
+        Remove every entry, returns how many were removed
+        """
+        amount = len(self.entries)
+        self.entries.clear()
+        return amount
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Percentage of lookups that were hits
+        """
+        lookups = self.hits + self.misses
+        return round(self.hits / lookups * 100, 2) if lookups else 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Stats about the cache
+
+        Returns
+        -------
+        Dict[str, Any]
+        """
+        return {
+            "size": f"{len(self.entries)}/{self.maxsize}",
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit rate": f"{self.hit_rate}%",
+            "evictions": self.evictions,
+        }
+
+    def render(self) -> str:
+        """
+        Render stats for an embed
+
+        Returns
+        -------
+        str
+        """
+        return "\n".join(f"{key}: {value}" for key, value in self.stats().items())
@@ -0,0 +1,149 @@
+"""
+In memory message history for watched channels, so alerts don't need the API
+"""
+
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional
+
+import discord
+
+__all__ = ("MessageRecord", "ChannelHistory")
+
+
+class MessageRecord:
+    """
+    The bits of a message we actually show in an alert
+
+    Attributes
+    ----------
+    message_id: int
+        The message id
+    author_id: int
+        The authors id
+    author: str
+        The authors name and discriminator
+    content: str
+        The message content, cut down to the size we preview
+    """
+
+    __slots__ = ("message_id", "author_id", "author", "content")
+
+    def __init__(
+        self, message_id: int, author_id: int, author: str, content: str
+    ) -> None:
+        """
+        Init the record
+        """
+        self.message_id = message_id
+        self.author_id = author_id
+        self.author = author
+        self.content = content
+
+
+class ChannelHistory:
+    """
+    A ring buffer of the last few messages for every watched channel
+
+    Channels are kept in least recently active order, once we're tracking
+    max_channels the quietest one gets dropped.
+    """
+
+    def __init__(
+        self, size: int = 5, max_channels: int = 1000, preview: int = 500
+    ) -> None:
+        """
+        Init the history
+
+        Parameters
+        ----------
+        size: int
+            Messages kept per channel
+        max_channels: int
+            The most channels we track at once
+        preview: int
+            The most characters of content we keep per message
+        """
+        self.size = max(1, size)
+        self.max_channels = max(1, max_channels)
+        self.preview = preview
+        self.channels: OrderedDict = OrderedDict()
+
+    def record(self, msg: discord.Message) -> None:
+        """
+        Add a message to its channels buffer
+
+        Parameters
+        ----------
+        msg: discord.Message
+            The message to add
+        """
+        buffer: Optional[Deque[MessageRecord]] = self.channels.get(msg.channel.id)
+        if buffer is None:
+            buffer = self.channels[msg.channel.id] = deque(maxlen=self.size)
+            while len(self.channels) > self.max_channels:
+                self.channels.popitem(last=False)
+        else:
+            self.channels.move_to_end(msg.channel.id)
+        buffer.append(
+            MessageRecord(
+                msg.id,
+                msg.author.id,
+                f"{msg.author.name}#{msg.author.discriminator}",
+                self.trim(msg.content),
+            )
+        )
+
+    def trim(self, content: str) -> str:
+        """
+        Cut content down to our preview size
+        """
+        if len(content) > self.preview:
+            return f"{content[: self.preview - 3]}..."
+        return content
+
+    def find(self, channel_id: int, message_id: int) -> Optional[MessageRecord]:
+        """
+        Find a record if we still have it
+        """
+        for record in self.channels.get(channel_id, ()):
+            if record.message_id == message_id:
+                return record
+        return None
+
+    def edit(self, channel_id: int, message_id: int, content: str) -> None:
+        """
+        Update a records content after an edit
+        """
+        record = self.find(channel_id, message_id)
+        if record:
+            record.content = self.trim(content)
+
+    def delete(self, channel_id: int, message_id: int) -> None:
+        """
+        Remove a deleted message from its buffer
+        """
+        record = self.find(channel_id, message_id)
+        if record:
+            self.channels[channel_id].remove(record)
+
+    def recent(self, channel_id: int) -> List[MessageRecord]:
+        """
+        Get the buffered messages for a channel, oldest first
+
+        Parameters
+        ----------
+        channel_id: int
+            The channel id
+
+        Returns
+        -------
+        List[MessageRecord]
+        """
+        return list(self.channels.get(channel_id, ()))
+
+    def stats(self) -> str:
+        """
+        Readable stats for the dev command
+        """
+        messages = sum(len(buffer) for buffer in self.channels.values())
+        return f"channels: {len(self.channels)}/{self.max_channels}\nmessages: {messages}\nper channel: {self.size}"
@@ -0,0 +1,530 @@
+"""
+Batched model inference for sentinel, so we run one forward pass for many messages
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from .metrics import Histogram
+
+__all__ = (
+    "InferenceError",
+    "ThreadBackend",
+    "ProcessBackend",
+    "OnnxBackend",
+    "create_backend",
+    "InferenceBatcher",
+)
+
+Predictor = Callable[[List[str]], Awaitable[Dict[str, List[float]]]]
+
+WORKER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "inference_worker.py"
+)
+
+
+class InferenceError(Exception):
+    """
+    When a model worker fails to give us a result
+    """
+
+
+class ThreadBackend:
+    """
+    Runs the model inside the bot process on the loops default executor
+    """
+
+    name = "thread"
+    concurrency = 1
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, model_type: str) -> None:
+        """
+        Load the model, this blocks for a while
+        """
+        from detoxify import Detoxify  # pylint: disable=import-outside-toplevel
+
+        self.loop = loop
+        self.model = Detoxify(model_type=model_type)
+
+    async def start(self) -> None:
+        """
+        Nothing to start, the model is already loaded
+        """
+
+    async def close(self) -> None:
+        """
+        Nothing to close either
+        """
+
+    async def predict(self, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Run a batch of texts through the model
+        """
+        return await self.loop.run_in_executor(None, self.model.predict, texts)
+
+    def stats(self) -> Dict[str, str]:
+        """
+        Readable stats for the dev command
+        """
+        return {"Backend": "thread (in process)"}
+
+
+class InferenceWorker:
+    """
+    A single worker process, see gears/inference_worker.py
+    """
+
+    def __init__(self, model_type: str, threads: int) -> None:
+        """
+        Init, the process isn't started until start is called
+        """
+        self.model_type = model_type
+        self.threads = threads
+        self.process: asyncio.subprocess.Process = None
+        self.reader: asyncio.Task = None
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.counter: int = 0
+        self.restarts: int = -1
+
+    @property
+    def alive(self) -> bool:
+        """
+        Whether the process is up and reading requests
+        """
+        return (
+            self.process is not None
+            and self.process.returncode is None
+            and self.reader is not None
+            and not self.reader.done()
+        )
+
+    async def start(self) -> None:
+        """
+        Spawn the process and wait for it to finish loading the model
+        """
+        self.restarts += 1
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            WORKER_PATH,
+            self.model_type,
+            str(self.threads),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=2**22,
+        )
+        ready = await self.process.stdout.readline()
+        if not ready:
+            raise InferenceError("Sentinel worker exited before loading the model")
+        self.reader = asyncio.get_running_loop().create_task(self.read())
+
+    async def close(self) -> None:
+        """
+        Kill the process and fail anything waiting on it
+        """
+        if self.process and self.process.returncode is None:
+            self.process.kill()
+            await self.process.wait()
+        if self.reader:
+            self.reader.cancel()
+        self.fail_pending("Sentinel worker was closed")
+
+    def fail_pending(self, reason: str) -> None:
+        """
+        Fail every request still waiting on this worker
+        """
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(InferenceError(reason))
+        self.pending.clear()
+
+    async def read(self) -> None:
+        """
+        Read replies and resolve their futures until the process dies, or sends
+        something we can't read
+        """
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                future = self.pending.pop(reply["id"], None)
+                if future is None or future.done():
+                    continue
+                if "error" in reply:
+                    future.set_exception(InferenceError(reply["error"]))
+                else:
+                    future.set_result(reply["result"])
+        finally:
+            self.fail_pending("Sentinel worker crashed")
+
+    async def request(self, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Send texts to the worker and wait for the scores
+        """
+        self.counter += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.counter] = future
+        try:
+            self.process.stdin.write(
+                (json.dumps({"id": self.counter, "texts": texts}) + "\n").encode()
+            )
+            await self.process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as error:
+            # The process died under us, fail like a crash so predict retries
+            self.pending.pop(self.counter, None)
+            raise InferenceError("Sentinel worker pipe closed") from error
+        return await future
+
+
+class ProcessBackend:
+    """
+    Runs the model in separate worker processes so torch never fights the gateway
+    for the GIL
+
+    Each worker loads the model once at startup. We only allow max_pending batches
+    in flight per worker, anything past that waits, and a worker that dies gets
+    restarted on the next request.
+    """
+
+    name = "process"
+
+    def __init__(
+        self,
+        model_type: str,
+        workers: int = 2,
+        max_pending: int = 2,
+        threads: int = 1,
+    ) -> None:
+        """
+        Init, workers aren't spawned until start is called
+        """
+        self.workers = [
+            InferenceWorker(model_type, threads) for _ in range(max(1, workers))
+        ]
+        self.concurrency = len(self.workers) * max(1, max_pending)
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.restart_lock = asyncio.Lock()
+        self.waiting: int = 0
+
+    async def start(self) -> None:
+        """
+        Spawn every worker
+        """
+        await asyncio.gather(*(worker.start() for worker in self.workers))
+
+    async def close(self) -> None:
+        """
+        Close every worker
+        """
+        await asyncio.gather(*(worker.close() for worker in self.workers))
+
+    async def worker(self) -> InferenceWorker:
+        """
+        Get the least busy worker, restarting any that have crashed
+        """
+        async with self.restart_lock:
+            for worker in self.workers:
+                if not worker.alive:
+                    await worker.close()
+                    await worker.start()
+        return min(self.workers, key=lambda worker: len(worker.pending))
+
+    async def predict(self, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Run a batch of texts on a worker, retrying once if the worker crashes
+        """
+        self.waiting += 1
+        async with self.slots:
+            self.waiting -= 1
+            try:
+                return await (await self.worker()).request(texts)
+            except InferenceError:
+                return await (await self.worker()).request(texts)
+
+    def stats(self) -> Dict[str, str]:
+        """
+        Readable stats for the dev command
+        """
+        workers = "\n".join(
+            f"{index}. pid {worker.process.pid if worker.process else None} "
+            f"{'up' if worker.alive else 'down'} | {len(worker.pending)} pending "
+            f"| {worker.restarts} restarts"
+            for index, worker in enumerate(self.workers, start=1)
+        )
+        return {"Backend": f"process\n{workers}\n{self.waiting} waiting for a slot"}
+
+
+class OnnxBackend:
+    """
+    Runs an exported, int8 quantized ONNX version of the model with ONNX Runtime
+
+    Much lighter than torch on CPU only hosts. The model directory is made by
+    scripts/sentinel_onnx.py and holds the onnx file, the tokenizer and labels.json.
+    """
+
+    name = "onnx"
+    concurrency = 1
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        path: str,
+        filename: str = "model.int8.onnx",
+        threads: int = 1,
+    ) -> None:
+        """
+        Load the session and tokenizer, this blocks for a bit
+        """
+        # pylint: disable=import-outside-toplevel
+        import numpy
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        self.loop = loop
+        self.numpy = numpy
+        self.path = os.path.join(path, filename)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            self.path, options, providers=["CPUExecutionProvider"]
+        )
+        self.inputs = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        with open(os.path.join(path, "labels.json"), "r", encoding="utf-8") as file:
+            self.labels: List[str] = json.load(file)
+
+    async def start(self) -> None:
+        """
+        Nothing to start, the session is already loaded
+        """
+
+    async def close(self) -> None:
+        """
+        Nothing to close either
+        """
+
+    def run(self, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Tokenize and run a batch, same output shape as Detoxify.predict
+        """
+        encoded = self.tokenizer(
+            texts, return_tensors="np", truncation=True, padding=True
+        )
+        logits = self.session.run(
+            None, {name: encoded[name] for name in self.inputs if name in encoded}
+        )[0]
+        scores = 1 / (1 + self.numpy.exp(-logits))
+        return {
+            label: scores[:, index].tolist() for index, label in enumerate(self.labels)
+        }
+
+    async def predict(self, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Run a batch of texts through the session, ONNX Runtime drops the GIL
+        """
+        return await self.loop.run_in_executor(None, self.run, texts)
+
+    def stats(self) -> Dict[str, str]:
+        """
+        Readable stats for the dev command
+        """
+        return {"Backend": f"onnx\n{self.path}"}
+
+
+def create_backend(options: dict, loop: asyncio.AbstractEventLoop):
+    """
+    Create the inference backend picked in the Sentinel section of bot_config.json
+
+    Parameters
+    ----------
+    options: dict
+        The Sentinel config section
+    loop: asyncio.AbstractEventLoop
+        The bots loop
+
+    Returns
+    -------
+    Union[ThreadBackend, ProcessBackend, OnnxBackend]
+    """
+    model_type = options.get("Model", "unbiased")
+    backend = options.get("Backend", "thread")
+    if backend == "process":
+        return ProcessBackend(
+            model_type,
+            options.get("Workers", 2),
+            options.get("MaxPending", 2),
+            options.get("WorkerThreads", 1),
+        )
+    if backend == "onnx":
+        return OnnxBackend(
+            loop,
+            options.get("OnnxPath", "models/sentinel"),
+            options.get("OnnxFile", "model.int8.onnx"),
+            options.get("WorkerThreads", 1),
+        )
+    if backend == "thread":
+        return ThreadBackend(loop, model_type)
+    raise ValueError(f"Unknown sentinel backend {backend}")
+
+
+class InferenceBatcher:
+    """
+    Queue messages up and run them through the model in batches
+
+    A single worker drains up to batch_size messages, waiting at most max_wait
+    milliseconds for the batch to fill, runs one prediction and resolves every
+    callers future with its own scores. At most concurrency batches run at once,
+    while they're busy new messages pile up into the next batch.
+    """
+
+    def __init__(
+        self,
+        predictor: Predictor,
+        batch_size: int = 16,
+        max_wait: float = 25,
+        concurrency: int = 1,
+    ) -> None:
+        """
+        Init the batcher
+
+        Parameters
+        ----------
+        predictor: Predictor
+            Coroutine function taking a list of texts, returning a dict of label to
+            a list of scores in the same order as the texts
+        batch_size: int
+            The most messages we put through the model at once
+        max_wait: float
+            How long in milliseconds we wait for a batch to fill
+        concurrency: int
+            How many batches can be in the model at once
+        """
+        self.predictor = predictor
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max(0, max_wait) / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.worker: asyncio.Task = None
+        self.slots = asyncio.Semaphore(max(1, concurrency))
+        self.running: set = set()
+        self.queue_depth = Histogram()
+        self.batch_sizes = Histogram()
+        self.latency = Histogram()
+
+    def start(self) -> None:
+        """
+        Start the worker if it isn't already running
+        """
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.get_running_loop().create_task(self.run())
+
+    async def close(self) -> None:
+        """
+        Stop the worker, anything still queued gets cancelled
+        """
+        if self.worker:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+        while not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            future.cancel()
+
+    async def predict(self, text: str) -> Dict[str, float]:
+        """
+        Queue a text up and wait for its scores
+
+        Parameters
+        ----------
+        text: str
+            The text to score
+
+        Returns
+        -------
+        Dict[str, float]
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.queue_depth.record(self.queue.qsize())
+        self.queue.put_nowait((text, future))
+        return await future
+
+    async def collect(self) -> List[Tuple[str, asyncio.Future]]:
+        """
+        Wait for the first message, then fill the batch until it's full or we run
+        out of time
+        """
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self) -> None:
+        """
+        Worker loop, waits for a free slot before collecting the next batch
+        """
+        while True:
+            await self.slots.acquire()
+            batch = [item for item in await self.collect() if not item[1].done()]
+            if not batch:
+                self.slots.release()
+                continue
+            self.batch_sizes.record(len(batch))
+            task = asyncio.get_running_loop().create_task(self.flush(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def flush(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """
+        Run a batch through the model and hand every caller their scores
+        """
+        start = time.perf_counter()
+        try:
+            results = await self.predictor([text for text, _ in batch])
+            self.latency.record(round((time.perf_counter() - start) * 1000, 2))
+        except Exception as e:  # pylint: disable=broad-except
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.slots.release()
+
+        for index, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(
+                    {label: scores[index] for label, scores in results.items()}
+                )
+
+    def stats(self) -> Dict[str, str]:
+        """
+        Readable stats for the dev command
+
+        Returns
+        -------
+        Dict[str, str]
+        """
+        return {
+            "Queue Depth": f"{self.queue.qsize()} queued now\n{self.queue_depth.render()}",
+            "Batch Size": f"{len(self.running)} running now\n{self.batch_sizes.render()}",
+            "Batch Latency (ms)": self.latency.render(),
+        }
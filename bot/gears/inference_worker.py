@@ -0,0 +1,45 @@
+"""
+Standalone sentinel inference worker
+
+Started by ProcessBackend in gears/inference.py, this loads the model once and
+then answers requests over stdin/stdout, one json object per line. It's run as
+a script so it never imports the bot itself.
+"""
+
+import json
+import sys
+
+
+def main() -> None:
+    """
+    Load the model then serve requests until stdin closes
+    """
+    model_type = sys.argv[1] if len(sys.argv) > 1 else "unbiased"
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    # Anything the model libraries print must not end up in our protocol stream
+    protocol = sys.stdout
+    sys.stdout = sys.stderr
+
+    import torch
+    from detoxify import Detoxify
+
+    torch.set_num_threads(threads)
+    model = Detoxify(model_type=model_type, device="cpu")
+
+    protocol.write(json.dumps({"ready": True}) + "\n")
+    protocol.flush()
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            with torch.inference_mode():
+                reply = {"id": request["id"], "result": model.predict(request["texts"])}
+        except Exception as e:  # pylint: disable=broad-except
+            reply = {"id": request["id"], "error": f"{e.__class__.__name__}: {e}"}
+        protocol.write(json.dumps(reply) + "\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Small in memory metrics so we can see what the bot is actually doing
+"""
+
+from typing import Dict, List
+
+__all__ = ("Histogram",)
+
+
+class Histogram:
+    """
+    A power of two bucketed histogram, cheap enough to update on every message
+
+    Attributes
+    ----------
+    buckets: Dict[int, int]
+        Upper bound of each bucket mapped to how many values landed in it
+    count: int
+        Total values recorded
+    total: float
+        Sum of every value recorded
+    maximum: float
+        The largest value recorded
+    """
+
+    __slots__ = ("buckets", "count", "total", "maximum")
+
+    def __init__(self) -> None:
+        """
+        Init an empty histogram
+        """
+        self.buckets: Dict[int, int] = {}
+        self.count: int = 0
+        self.total: float = 0
+        self.maximum: float = 0
+
+    def record(self, value: float) -> None:
+        """
+        Record a value
+
+        Parameters
+        ----------
+        value: float
+            The value to record, negative values are treated as 0
+        """
+        bound = 1
+        while bound < value:
+            bound <<= 1
+        self.buckets[bound] = self.buckets.get(bound, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    @property
+    def mean(self) -> float:
+        """
+        Mean of every value recorded
+        """
+        return self.total / self.count if self.count else 0
+
+    def reset(self) -> None:
+        """
+        Clear the histogram
+        """
+        self.buckets.clear()
+        self.count = 0
+        self.total = 0
+        self.maximum = 0
+
+    def render(self) -> str:
+        """
+        Render the histogram into something readable for an embed
+
+        Returns
+        -------
+        str
+        """
+        if not self.count:
+            return "No data"
+        lines: List[str] = []
+        for bound in sorted(self.buckets):
+            amount = self.buckets[bound]
+            bar = "█" * max(1, round(amount / self.count * 20))
+            lines.append(f"<= {bound:<6} {bar} {amount}")
+        lines.append(
+            f"count {self.count} | mean {round(self.mean, 2)} | max {self.maximum}"
+        )
+        return "\n".join(lines)
@@ -0,0 +1,133 @@
+"""
+One on_message pipeline so every message is only parsed once
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import discord
+from discord.ext import commands
+
+from .metrics import Histogram
+
+__all__ = ("MessagePipeline",)
+
+Stage = Callable[[discord.Message, Optional[commands.Context]], Awaitable[None]]
+
+
+class PipelineStage:
+    """
+    A registered stage and its timings
+    """
+
+    __slots__ = ("name", "handler", "bots", "timings", "errors")
+
+    def __init__(self, name: str, handler: Stage, bots: bool) -> None:
+        """
+        Init the stage
+        """
+        self.name = name
+        self.handler = handler
+        self.bots = bots
+        self.timings = Histogram()
+        self.errors = 0
+
+
+class MessagePipeline:
+    """
+    Builds the context for a message once, then hands it to every stage
+
+    Stages are coroutines taking the message and its context, they run
+    concurrently like separate listeners would. Messages from bots only go to
+    stages registered with bots=True and never get a context built.
+    """
+
+    def __init__(self, bot: commands.Bot) -> None:
+        """
+        Init the pipeline
+
+        Parameters
+        ----------
+        bot: commands.Bot
+            The bot, used to build contexts and report stage errors
+        """
+        self.bot = bot
+        self.stages: Dict[str, PipelineStage] = {}
+        self.context = Histogram()
+
+    def register(self, name: str, handler: Stage, bots: bool = False) -> None:
+        """
+        Register a stage, replacing any stage with the same name
+
+        Parameters
+        ----------
+        name: str
+            The stages name, shown in stats
+        handler: Stage
+            Coroutine taking the message and its context
+        bots: bool
+            Whether the stage also wants messages from bots, these get no context
+        """
+        self.stages[name] = PipelineStage(name, handler, bots)
+
+    def unregister(self, name: str) -> None:
+        """
+        Remove a stage if it's registered
+        """
+        self.stages.pop(name, None)
+
+    async def run(self, message: discord.Message) -> None:
+        """
+        Run a message through every stage that wants it
+
+        Parameters
+        ----------
+        message: discord.Message
+            The message
+        """
+        ctx = None
+        if message.author.bot:
+            stages = [stage for stage in self.stages.values() if stage.bots]
+            if not stages:
+                return
+        else:
+            stages = list(self.stages.values())
+            start = time.perf_counter()
+            ctx = await self.bot.get_context(message)
+            self.context.record(round((time.perf_counter() - start) * 1000, 3))
+
+        await asyncio.gather(*(self.run_stage(stage, message, ctx) for stage in stages))
+
+    async def run_stage(
+        self,
+        stage: PipelineStage,
+        message: discord.Message,
+        ctx: Optional[commands.Context],
+    ) -> None:
+        """
+        Run and time a single stage, errors go to on_error like a listener's would
+        """
+        start = time.perf_counter()
+        try:
+            await stage.handler(message, ctx)
+        except Exception:  # pylint: disable=broad-except
+            stage.errors += 1
+            await self.bot.on_error(f"pipeline_{stage.name}", message)
+        finally:
+            stage.timings.record(round((time.perf_counter() - start) * 1000, 3))
+
+    def stats(self) -> Dict[str, str]:
+        """
+        Readable per stage timings in milliseconds for the dev command
+
+        Returns
+        -------
+        Dict[str, str]
+        """
+        stats = {"Context": self.context.render()}
+        for stage in self.stages.values():
+            stats[
+                f"{stage.name.title()} ({'all' if stage.bots else 'users'}, {stage.errors} errors)"
+            ] = stage.timings.render()
+        return stats
@@ -0,0 +1,154 @@
+"""
+Cheap lexical screening so only suspicious messages pay for the full sentinel model
+"""
+
+import re
+from typing import Dict, Iterable
+
+__all__ = ("LexicalPrefilter",)
+
+# Stems, matched at the start of a word so we catch most inflections
+DEFAULT_PATTERNS = (
+    "fuck",
+    "fck",
+    "shit",
+    "bitch",
+    "cunt",
+    "dick",
+    "cock",
+    "pussy",
+    "whore",
+    "slut",
+    "bastard",
+    "asshole",
+    "retard",
+    "fag",
+    "nigg",
+    "tranny",
+    "kys",
+    "kill",
+    "die",
+    "dead",
+    "murder",
+    "shoot",
+    "stab",
+    "rape",
+    "hang",
+    "stupid",
+    "idiot",
+    "dumb",
+    "moron",
+    "loser",
+    "ugly",
+    "hate",
+    "trash",
+    "garbage",
+    "porn",
+    "sex",
+    "nude",
+    "naked",
+    "horny",
+    "suck",
+    "stfu",
+    "gtfo",
+    "wtf",
+)
+
+# Common character swaps people use to dodge filters
+LEET = str.maketrans("013457@$!", "oieastasi")
+
+
+class LexicalPrefilter:
+    """
+    A compiled keyword automaton plus a shouting check
+
+    Messages that match nothing are considered benign and skip the model. The
+    patterns don't catch everything the model does, so it's off unless enabled.
+
+    Attributes
+    ----------
+    screened: int
+        Messages we've looked at
+    passed: int
+        Messages we've sent on to the model
+    """
+
+    def __init__(
+        self,
+        patterns: Iterable[str] = (),
+        caps_ratio: float = 0.7,
+        enabled: bool = False,
+    ) -> None:
+        """
+        Build the automaton
+
+        Parameters
+        ----------
+        patterns: Iterable[str]
+            Extra regex patterns on top of the defaults, matched at word starts
+        caps_ratio: float
+            Ratio of uppercase letters above which a message counts as shouting
+        enabled: bool
+            When disabled every message is sent to the model
+        """
+        self.enabled = enabled
+        self.caps_ratio = caps_ratio
+        self.regex = re.compile(
+            r"\b(?:" + "|".join((*DEFAULT_PATTERNS, *patterns)) + ")",
+            re.IGNORECASE,
+        )
+        self.screened: int = 0
+        self.passed: int = 0
+
+    def shouting(self, text: str) -> bool:
+        """
+        Check if most of a messages letters are uppercase
+        """
+        letters = upper = 0
+        for char in text:
+            if char.isalpha():
+                letters += 1
+                if char.isupper():
+                    upper += 1
+        return letters >= 10 and upper / letters >= self.caps_ratio
+
+    def suspicious(self, text: str) -> bool:
+        """
+        Check if a message should go through the full model
+
+        Parameters
+        ----------
+        text: str
+            The message content
+
+        Returns
+        -------
+        bool
+        """
+        if not self.enabled:
+            return True
+        self.screened += 1
+        if (
+            self.regex.search(text)
+            or self.regex.search(text.translate(LEET))
+            or self.shouting(text)
+        ):
+            self.passed += 1
+            return True
+        return False
+
+    def stats(self) -> Dict[str, str]:
+        """
+        Readable stats for the dev command
+
+        Returns
+        -------
+        Dict[str, str]
+        """
+        if not self.enabled:
+            return {"Pre-filter": "disabled"}
+        skipped = self.screened - self.passed
+        rate = round(skipped / self.screened * 100, 2) if self.screened else 0
+        return {
+            "Pre-filter": f"screened: {self.screened}\nsent to model: {self.passed}\nshort-circuited: {skipped} ({rate}%)"
+        }
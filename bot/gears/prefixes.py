@@ -0,0 +1,77 @@
+"""
+Prefix matching without building a list of prefixes for every message
+"""
+
+from typing import Dict, Iterable, Optional
+
+__all__ = ("PrefixTrie",)
+
+END = ""
+
+
+class PrefixTrie:
+    """
+    A character trie of prefixes, matching walks the start of a message once and
+    returns the longest prefix it passed through
+
+    Nodes are plain dicts of character to node, a node that ends a prefix stores
+    that prefix under the empty string key.
+    """
+
+    __slots__ = ("root", "size")
+
+    def __init__(self, prefixes: Iterable[str] = ()) -> None:
+        """
+        Init the trie
+
+        Parameters
+        ----------
+        prefixes: Iterable[str]
+            Prefixes to add right away
+        """
+        self.root: Dict[str, dict] = {}
+        self.size: int = 0
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def add(self, prefix: str) -> None:
+        """
+        Add a prefix, empty prefixes are ignored
+        """
+        if not prefix:
+            return
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        if END not in node:
+            node[END] = prefix
+            self.size += 1
+
+    def match(self, content: str) -> Optional[str]:
+        """
+        Find the longest prefix content starts with
+
+        Parameters
+        ----------
+        content: str
+            The message content
+
+        Returns
+        -------
+        Optional[str]
+            The prefix or None if nothing matched
+        """
+        node = self.root
+        found = None
+        for char in content:
+            node = node.get(char)
+            if node is None:
+                break
+            found = node.get(END, found)
+        return found
+
+    def __len__(self) -> int:
+        """
+        Amount of prefixes in the trie
+        """
+        return self.size
@@ -0,0 +1,146 @@
+"""
+TagScript interpreter with an opt-in per block profiler
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+import bTagScript as tse
+from bTagScript.utils import maybe_await
+
+__all__ = ("BlockTiming", "ProfilingInterpreter", "render_profile")
+
+
+class BlockTiming:
+    """
+    How long a block spent deciding whether to accept verbs and processing the
+    ones it did accept, times are in seconds
+    """
+
+    __slots__ = ("checks", "check_time", "hits", "process_time")
+
+    def __init__(self) -> None:
+        """
+        Init empty timings
+        """
+        self.checks = 0
+        self.check_time = 0.0
+        self.hits = 0
+        self.process_time = 0.0
+
+    @property
+    def total(self) -> float:
+        """
+        Check and process time together
+        """
+        return self.check_time + self.process_time
+
+    def merge(self, other: "BlockTiming") -> None:
+        """
+        Add another timing to this one
+        """
+        self.checks += other.checks
+        self.check_time += other.check_time
+        self.hits += other.hits
+        self.process_time += other.process_time
+
+
+def render_profile(profile: Dict[str, BlockTiming], limit: int = 5) -> str:
+    """
+    The blocks that took longest, one per line
+
+    Parameters
+    ----------
+    profile: Dict[str, BlockTiming]
+        Timings keyed by block name
+    limit: int
+        The most blocks to show
+
+    Returns
+    -------
+    str
+    """
+    ranked = sorted(profile.items(), key=lambda item: item[1].total, reverse=True)
+    return "\n".join(
+        f"{name}: {round(timing.total * 1000, 3)}ms "
+        f"({timing.hits}/{timing.checks} accepted)"
+        for name, timing in ranked[:limit]
+    )
+
+
+class ProfilingInterpreter(tse.interpreter.AsyncInterpreter):
+    """
+    An AsyncInterpreter that can time every block it runs
+    """
+
+    __slots__ = ()
+
+    async def process(
+        self,
+        message: str,
+        seed_variables: Dict[str, tse.interface.Adapter] = None,
+        *,
+        charlimit: Optional[int] = None,
+        profile: bool = False,
+        **kwargs: Any,
+    ) -> tse.Response:
+        """
+        Process a tag like AsyncInterpreter.process
+
+        With profile set every block's time is recorded into a dict of
+        BlockTiming under the "profile" extra of the response.
+
+        Parameters
+        ----------
+        message: str
+            The tagscript
+        seed_variables: Dict[str, tse.interface.Adapter]
+            Seed variables for this run
+        charlimit: Optional[int]
+            The most characters to process
+        profile: bool
+            Whether to time every block
+
+        Returns
+        -------
+        tse.Response
+        """
+        if profile:
+            kwargs["profile"] = {}
+        return await super().process(
+            message, seed_variables, charlimit=charlimit, **kwargs
+        )
+
+    async def _process_blocks(
+        self, ctx: tse.interpreter.Context, node: tse.interpreter.Node
+    ) -> Optional[str]:
+        """
+        AsyncInterpreter._process_blocks, timing each block when the run is
+        being profiled
+        """
+        profile = ctx.response.extras.get("profile")
+        if profile is None:
+            return await super()._process_blocks(ctx, node)
+
+        for block in self.blocks:
+            timing = profile.get(type(block).__name__)
+            if timing is None:
+                timing = profile[type(block).__name__] = BlockTiming()
+            start = time.perf_counter()
+            accepted = await maybe_await(block.will_accept, ctx)
+            timing.checks += 1
+            timing.check_time += time.perf_counter() - start
+            if not accepted:
+                continue
+
+            start = time.perf_counter()
+            try:
+                value = await maybe_await(block.process, ctx)
+            finally:
+                timing.hits += 1
+                timing.process_time += time.perf_counter() - start
+            if value is not None:
+                value = str(value)
+                node.output = value
+                return value
+        return None
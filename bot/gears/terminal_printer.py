@@ -86,6 +86,23 @@ class TerminalPrinter:
         msg = f"{self.gen_category(category)} {cog}"
         print(msg)
 
+    async def progress(self, info: str, done: int, total: int) -> None:
+        """
+        [PROGRESS] How far along something long running is
+
+        Parameters
+        ----------
+        info: str
+            What's being worked on
+        done: int
+            How much is done
+        total: int
+            How much there is overall
+        """
+        percent = round(done / total * 100, 1) if total else 100.0
+        msg = f"{self.gen_category(f'{Fore.GREEN}PROGRESS')} {info} {done}/{total} ({percent}%)"
+        print(msg)
+
     async def bot_update(self, status: str) -> None:
         """
         [LOGGED IN|LOGGED OUT] When the bots logged in or logged out with relevant info
@@ -1,9 +1,15 @@
-from typing import List, Optional
+import asyncio
+import itertools
+import json
+import sys
+from typing import Dict, Iterator, Optional
 
 import asqlite
 import discord
 from discord.ext import commands
 
+from .cache import LRUCache
+
 
 def benny_only() -> commands.check:
     """
@@ -27,11 +33,13 @@ class User:
     Represents a users data profile for the bot
     """
 
+    __slots__ = ("user_id", "premium_level", "is_blacklisted", "timezone")
+
     def __init__(self, user: tuple) -> None:
         """
         Init with a tuple of the users data
         """
-        self.user_id: str = user[0]
+        self.user_id: int = int(user[0])
         self.premium_level: int = user[1]
         self.is_blacklisted: bool = user[2]
         self.timezone: Optional[str] = user[3]
@@ -42,50 +50,167 @@ class UserManager:
     Class to access our users info
     """
 
-    def __init__(self, bot: commands.Bot, database: asqlite.Connection) -> None:
+    def __init__(
+        self,
+        bot: commands.Bot,
+        database: asqlite.Connection,
+        cache_size: int = 10000,
+        lazy: bool = False,
+        idle: float = 1800,
+    ) -> None:
         """
         Init with the userdb
+
+        Parameters
+        ----------
+        bot: commands.Bot
+            The bot
+        database: asqlite.Connection
+            The users database
+        cache_size: int
+            The most users we keep that weren't loaded at ready
+        lazy: bool
+            Whether profiles are only made when a user first runs a command
+            instead of for every user at ready, users without a row get default
+            profiles that are never inserted
+        idle: float
+            Seconds an unused profile is kept for in lazy mode
         """
         self.bot = bot
         self.database = database
-        self.users: List[User] = []
+        self.lazy = lazy
+        self.users: Dict[int, User] = {}
+        self.cache = LRUCache(cache_size, idle if lazy else None)
+        self.loading: Dict[int, asyncio.Future] = {}
+        self.load_seconds: Optional[float] = None
 
     async def get_user(self, user_id: int) -> User:
         """
         Get a user from our database
+
+        Users loaded at ready and recently fetched ones are served from memory, a
+        miss fetches the user once no matter how many lookups are waiting on it
+
+        Parameters
+        ----------
+        user_id: int
+            The users id
+
+        Returns
+        -------
+        User
         """
-        for user in self.users:
-            if user.user_id == str(user_id):
-                return user
-        await self.fetch_user(user_id)
+        user_id = int(user_id)
+        user = self.users.get(user_id)
+        if user:
+            return user
+        user = self.cache.get(user_id)
+        if user:
+            if self.lazy:
+                # Restart its idle clock
+                self.cache.set(user_id, user)
+            return user
+
+        pending = self.loading.get(user_id)
+        if pending is None:
+            pending = self.loading[user_id] = asyncio.ensure_future(
+                self.fetch_user(user_id, not self.lazy)
+            )
+            pending.add_done_callback(lambda _: self.loading.pop(user_id, None))
+        data = await asyncio.shield(pending)
+
+        user = self.cache.get(user_id)
+        if not user:
+            user = User(data)
+            self.cache.set(user_id, user)
+        return user
 
     async def create_user(self, user_id: int) -> None:
         """
         Create a user in our small database
         """
         await self.database.execute(
-            """INSERT INTO settings_users VALUES(?, ?, ?, ?);""",
+            """INSERT OR IGNORE INTO settings_users VALUES(?, ?, ?, ?);""",
             (str(user_id), 0, False, None),
         )
         await self.database.commit()
 
-    async def fetch_user(self, user_id: int) -> tuple:
+    async def fetch_user(self, user_id: int, create: bool = True) -> tuple:
         """
-        Get a users info
+        Get a users info, users without a row get the defaults and only get a
+        row if create is set
         """
         async with self.database.execute(
             """SELECT * FROM settings_users WHERE id = ?;""", (str(user_id),)
         ) as cursor:
             result = await cursor.fetchone()
-            if not result:
+        if not result:
+            if create:
                 await self.create_user(user_id)
-                return await self.get_user(user_id)
-            return result
+            return (str(user_id), 0, False, None)
+        return tuple(result)
 
-    async def load_users(self) -> None:
+    def profiles(self) -> Iterator[User]:
+        """
+        Every profile held in memory, preloaded or cached
+        """
+        return itertools.chain(
+            self.users.values(), (entry[1] for entry in self.cache.entries.values())
+        )
+
+    def memory(self) -> int:
+        """
+        Rough bytes used by the profiles in memory and the containers holding them
+        """
+        return (
+            sys.getsizeof(self.users)
+            + sys.getsizeof(self.cache.entries)
+            + sum(
+                sys.getsizeof(user) + sys.getsizeof(user.timezone)
+                for user in self.profiles()
+            )
+        )
+
+    async def load_users(self, chunk: int = 50000) -> int:
         """
         Load every single user that we know of into our database
         Does not contain any private information.
+
+        Every stored row is read with one query and users we don't have yet are
+        inserted with a single statement, which is atomic on its own so nothing
+        else on the connection can land in the middle of it. Progress is printed
+        every chunk users and once the insert is done.
+
+        Parameters
+        ----------
+        chunk: int
+            How many users to build between progress lines
+
+        Returns
+        -------
+        int
+            How many users had to be inserted
         """
-        for user in self.bot.users:
-            self.users.append(User(await self.fetch_user(user.id)))
+        async with self.database.execute("""SELECT * FROM settings_users;""") as cursor:
+            stored = {row[0]: tuple(row) for row in await cursor.fetchall()}
+
+        users = list(self.bot.users)
+        missing = []
+        for index, user in enumerate(users, 1):
+            data = stored.get(str(user.id))
+            if not data:
+                data = (str(user.id), 0, False, None)
+                missing.append(data[0])
+            self.users[user.id] = User(data)
+            if index % chunk == 0:
+                await self.bot.terminal.progress("Users", index, len(users))
+
+        if missing:
+            # Every other column takes its default, the same values as above
+            await self.database.execute(
+                """INSERT OR IGNORE INTO settings_users (id) SELECT value FROM json_each(?);""",
+                (json.dumps(missing),),
+            )
+        if not users or len(users) % chunk:
+            await self.bot.terminal.progress("Users", len(users), len(users))
+        return len(missing)
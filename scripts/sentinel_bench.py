@@ -0,0 +1,489 @@
+"""
+Benchmark how many messages per second the sentinel pipeline can handle
+
+Run from the repository root
+
+    python scripts/sentinel_bench.py --backend stub
+    python scripts/sentinel_bench.py --backend onnx --concurrency 1 16 64 --out bench.json
+
+Messages are generated from the fixture corpus in assets/sentinel_corpus.json and
+pushed through SentinelManager.process with the webhook and channel history stubbed
+out, so nothing touches discord. Every combination of message length distribution
+and concurrency level is one run, the report is printed as JSON.
+
+The stub backend skips the model and sleeps for a fixed time per batch instead, use
+it to measure our own overhead. Any other backend is built from the Sentinel config
+section exactly like the bot does it.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bot")
+)
+
+# pylint: disable=wrong-import-position
+import psutil
+from cogs import sentinel
+from gears.history import MessageRecord
+from gears.inference import ProcessBackend
+
+LENGTHS = {
+    "short": (26, 80),
+    "medium": (80, 300),
+    "long": (300, 2000),
+}
+GUILD_ID = 1
+CHANNEL_ID = 1
+
+
+class StubBackend:
+    """
+    Pretends to be a model, sleeps for latency + per_text * len(texts) milliseconds
+    and hands back random scores, toxic_rate of which break the default thresholds
+    """
+
+    name = "stub"
+    concurrency = 1
+
+    def __init__(
+        self, latency: float, per_text: float, toxic_rate: float, seed: int
+    ) -> None:
+        """
+        Init the stub
+        """
+        self.latency = latency / 1000
+        self.per_text = per_text / 1000
+        self.toxic_rate = toxic_rate
+        self.random = random.Random(seed)
+
+    async def start(self) -> None:
+        """
+        Nothing to start
+        """
+
+    async def close(self) -> None:
+        """
+        Nothing to close
+        """
+
+    async def predict(self, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Sleep like a model would then make up scores
+        """
+        await asyncio.sleep(self.latency + self.per_text * len(texts))
+        results = {label: [] for label in sentinel.LABELS}
+        for _ in texts:
+            ceiling = 1 if self.random.random() < self.toxic_rate else 0.3
+            for label in sentinel.LABELS:
+                results[label].append(self.random.random() * ceiling)
+        return results
+
+    def stats(self) -> Dict[str, str]:
+        """
+        Matches the other backends
+        """
+        return {"Backend": "stub"}
+
+
+class StubAlerts:
+    """
+    Stands in for the AlertDispatcher, only counts what would have been sent
+    """
+
+    def __init__(self) -> None:
+        """
+        Init the counters
+        """
+        self.alerts = 0
+        self.characters = 0
+
+    def start(self) -> None:
+        """
+        Nothing to start
+        """
+
+    async def close(self) -> None:
+        """
+        Nothing to close
+        """
+
+    def submit(self, guild_id: int, url: str, author_id: int, embed) -> None:
+        """
+        Count the alert instead of queueing it
+        """
+        self.alerts += 1
+        self.characters += len(embed)
+
+
+class StubHistory:
+    """
+    Stands in for ChannelHistory, every channel has the same few messages
+    """
+
+    def __init__(self, size: int) -> None:
+        """
+        Build the fixed records
+        """
+        self.records = [
+            MessageRecord(index, index, f"User#{index:04}", f"Buffered message {index}")
+            for index in range(size)
+        ]
+
+    def record(self, msg) -> None:
+        """
+        Nothing to record
+        """
+
+    def recent(self, channel_id: int) -> List[MessageRecord]:
+        """
+        Always the same records
+        """
+        return list(self.records)
+
+    def stats(self) -> str:
+        """
+        Matches ChannelHistory
+        """
+        return f"stubbed, {len(self.records)} messages"
+
+
+class FakeUser:
+    """
+    The parts of discord.Member process looks at
+    """
+
+    __slots__ = ("id", "bot", "name", "discriminator")
+
+    def __init__(self, user_id: int) -> None:
+        """
+        Init the user
+        """
+        self.id = user_id
+        self.bot = False
+        self.name = f"User{user_id}"
+        self.discriminator = "0001"
+
+
+class FakeObject:
+    """
+    A guild or channel, we only need the id
+    """
+
+    __slots__ = ("id",)
+
+    def __init__(self, object_id: int) -> None:
+        """
+        Init the object
+        """
+        self.id = object_id
+
+
+class FakeMessage:
+    """
+    The parts of discord.Message process looks at
+    """
+
+    __slots__ = ("id", "author", "guild", "channel", "content", "clean_content")
+
+    def __init__(self, message_id: int, author: FakeUser, content: str) -> None:
+        """
+        Init the message
+        """
+        self.id = message_id
+        self.author = author
+        self.guild = FakeObject(GUILD_ID)
+        self.channel = FakeObject(CHANNEL_ID)
+        self.content = content
+        self.clean_content = content
+
+
+def build_corpus(
+    sentences: List[str],
+    distribution: str,
+    amount: int,
+    duplicates: float,
+    rng: random.Random,
+) -> List[FakeMessage]:
+    """
+    Generate messages by gluing corpus sentences together until they hit a length
+    picked from the distribution, mixed picks one of the others per message
+
+    Messages get a unique tag so the result cache doesn't hide the model, except for
+    the duplicates fraction which reuse an earlier message as is
+    """
+    users = [FakeUser(user_id) for user_id in range(1, 51)]
+    messages: List[FakeMessage] = []
+    for index in range(amount):
+        if messages and rng.random() < duplicates:
+            content = rng.choice(messages).content
+        else:
+            name = (
+                rng.choice(list(LENGTHS)) if distribution == "mixed" else distribution
+            )
+            target = rng.randint(*LENGTHS[name])
+            parts = [f"#{index}"]
+            size = len(parts[0])
+            while size < target:
+                sentence = rng.choice(sentences)
+                parts.append(sentence)
+                size += len(sentence) + 1
+            content = " ".join(parts)[:target]
+        messages.append(FakeMessage(index, rng.choice(users), content))
+    return messages
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Nearest rank percentile of already sorted values
+    """
+    if not values:
+        return 0
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return round(values[index], 3)
+
+
+def executor_depth(
+    manager: sentinel.SentinelManager,
+    executor: concurrent.futures.ThreadPoolExecutor,
+) -> int:
+    """
+    Work handed to the backend that hasn't started running yet
+    """
+    backend = manager.backend
+    if isinstance(backend, ProcessBackend):
+        return backend.waiting + sum(len(worker.pending) for worker in backend.workers)
+    return executor._work_queue.qsize()  # pylint: disable=protected-access
+
+
+def memory(process: psutil.Process) -> int:
+    """
+    RSS of us plus any worker processes
+    """
+    total = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+
+async def run(
+    manager: sentinel.SentinelManager,
+    messages: List[FakeMessage],
+    concurrency: int,
+    executor: concurrent.futures.ThreadPoolExecutor,
+    interval: float,
+) -> dict:
+    """
+    Push every message through process with concurrency callers at once, sampling
+    memory and queue depth in the background
+    """
+    manager.cache.clear()
+    manager.alerts.alerts = 0
+    for histogram in (
+        manager.batcher.queue_depth,
+        manager.batcher.batch_sizes,
+        manager.batcher.latency,
+    ):
+        histogram.reset()
+
+    process = psutil.Process()
+    samples = {"rss": [], "batcher": [], "executor": []}
+    latencies: List[float] = []
+    failures = 0
+    remaining = iter(messages)
+
+    async def sample() -> None:
+        while True:
+            samples["rss"].append(memory(process))
+            samples["batcher"].append(manager.batcher.queue.qsize())
+            samples["executor"].append(executor_depth(manager, executor))
+            await asyncio.sleep(interval)
+
+    async def caller() -> None:
+        nonlocal failures
+        for msg in remaining:
+            start = time.perf_counter()
+            try:
+                await manager.process(msg)
+            except Exception:  # pylint: disable=broad-except
+                failures += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    sampler = asyncio.get_running_loop().create_task(sample())
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    sampler.cancel()
+    try:
+        await sampler
+    except asyncio.CancelledError:
+        pass
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "messages": len(messages),
+        "seconds": round(elapsed, 4),
+        "throughput": round(len(messages) / elapsed, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(latencies[-1], 3),
+        },
+        "peak_rss_mb": round(max(samples["rss"]) / 1024 / 1024, 2),
+        "batcher_queue": {
+            "mean": round(sum(samples["batcher"]) / len(samples["batcher"]), 2),
+            "max": max(samples["batcher"]),
+        },
+        "executor_queue": {
+            "mean": round(sum(samples["executor"]) / len(samples["executor"]), 2),
+            "max": max(samples["executor"]),
+        },
+        "batch_size_mean": round(manager.batcher.batch_sizes.mean, 2),
+        "batch_latency_ms_mean": round(manager.batcher.latency.mean, 2),
+        "model_calls": manager.batcher.batch_sizes.count,
+        "alerts": manager.alerts.alerts,
+        "failures": failures,
+    }
+
+
+async def bench(args: argparse.Namespace) -> dict:
+    """
+    Build the manager once and go through every run
+    """
+    options = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as file:
+            options = json.load(file).get("Sentinel", {})
+    options.update(
+        {
+            key: value
+            for key, value in (
+                ("Backend", args.backend),
+                ("BatchSize", args.batch_size),
+                ("BatchWait", args.batch_wait),
+                ("PreFilter", args.prefilter),
+            )
+            if value is not None
+        }
+    )
+
+    loop = asyncio.get_running_loop()
+    executor = concurrent.futures.ThreadPoolExecutor()
+    loop.set_default_executor(executor)
+
+    if options.get("Backend") == "stub":
+        stub = StubBackend(
+            args.stub_latency, args.stub_per_text, args.toxic_rate, args.seed
+        )
+        sentinel.create_backend = lambda options, loop: stub
+
+    loaded = time.perf_counter()
+    manager = sentinel.SentinelManager(None, None, loop, "", options)
+    manager.alerts = StubAlerts()
+    manager.history = StubHistory(options.get("HistorySize", 5))
+    await manager.start()
+    loaded = time.perf_counter() - loaded
+
+    thresholds = [args.threshold] * len(sentinel.LABELS)
+    manager.sentinels[GUILD_ID] = sentinel.SentinelConfig(
+        str(CHANNEL_ID), False, "", "", "", *thresholds, not args.prefilter
+    )
+
+    with open(args.corpus, "r", encoding="utf-8") as file:
+        sentences = json.load(file)
+    rng = random.Random(args.seed)
+
+    report = {
+        "backend": manager.backend.name,
+        "options": options,
+        "load_seconds": round(loaded, 4),
+        "baseline_rss_mb": round(memory(psutil.Process()) / 1024 / 1024, 2),
+        "runs": [],
+    }
+    try:
+        warmup = build_corpus(sentences, "mixed", args.warmup, 0, rng)
+        if warmup:
+            await run(manager, warmup, max(args.concurrency), executor, args.interval)
+        for distribution in args.lengths:
+            for concurrency in args.concurrency:
+                messages = build_corpus(
+                    sentences, distribution, args.messages, args.duplicates, rng
+                )
+                result = await run(
+                    manager, messages, concurrency, executor, args.interval
+                )
+                result["lengths"] = distribution
+                report["runs"].append(result)
+                print(
+                    f"{distribution} x{concurrency}: {result['throughput']} msg/s",
+                    file=sys.stderr,
+                )
+    finally:
+        await manager.close()
+        executor.shutdown(wait=False)
+    return report
+
+
+def main() -> None:
+    """
+    Parse arguments and run
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--backend", choices=("stub", "thread", "process", "onnx"), default=None
+    )
+    parser.add_argument("--config", default=None, help="bot_config.json to read")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument(
+        "--lengths",
+        nargs="+",
+        choices=(*LENGTHS, "mixed"),
+        default=["short", "medium", "long", "mixed"],
+    )
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=32)
+    parser.add_argument("--duplicates", type=float, default=0)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--batch-wait", type=float, default=None)
+    parser.add_argument(
+        "--prefilter",
+        action="store_true",
+        default=None,
+        help="Screen messages with the lexical pre-filter, off by default so every message hits the model",
+    )
+    parser.add_argument("--threshold", type=int, default=75)
+    parser.add_argument("--stub-latency", type=float, default=20)
+    parser.add_argument("--stub-per-text", type=float, default=2)
+    parser.add_argument("--toxic-rate", type=float, default=0.1)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus", default="assets/sentinel_corpus.json")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    if args.backend is None and args.config is None:
+        args.backend = "stub"
+
+    report = asyncio.run(bench(args))
+    output = json.dumps(report, indent=4)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            file.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Export the sentinel model to an int8 quantized ONNX model and validate it
+
+Run from the repository root
+
+    python scripts/sentinel_onnx.py export --out models/sentinel
+    python scripts/sentinel_onnx.py validate --out models/sentinel
+
+Validation runs the fixture corpus in assets/sentinel_corpus.json through both the
+PyTorch Detoxify model and the ONNX backend the bot uses, then compares the scores.
+Set Sentinel.Backend to "onnx" and Sentinel.OnnxPath to the output directory in
+bot_config.json to use the exported model.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bot")
+)
+
+# pylint: disable=wrong-import-position
+import torch
+from detoxify import Detoxify
+from gears.inference import OnnxBackend
+
+
+def export(model_type: str, out: str, opset: int) -> None:
+    """
+    Export the model to onnx then quantize the weights to int8
+    """
+    from onnxruntime.quantization import (  # pylint: disable=import-outside-toplevel
+        QuantType,
+        quantize_dynamic,
+    )
+
+    os.makedirs(out, exist_ok=True)
+    detoxify = Detoxify(model_type=model_type, device="cpu")
+    model = detoxify.model.eval()
+    sample = detoxify.tokenizer(
+        ["export sample text", "a second, slightly longer export sample text"],
+        return_tensors="pt",
+        padding=True,
+        truncation=True,
+    )
+    names = [name for name in ("input_ids", "attention_mask") if name in sample]
+    full_path = os.path.join(out, "model.onnx")
+
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in names),
+            full_path,
+            input_names=names,
+            output_names=["logits"],
+            dynamic_axes={
+                **{name: {0: "batch", 1: "sequence"} for name in names},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset,
+        )
+    quantize_dynamic(
+        full_path, os.path.join(out, "model.int8.onnx"), weight_type=QuantType.QInt8
+    )
+
+    detoxify.tokenizer.save_pretrained(out)
+    with open(os.path.join(out, "labels.json"), "w", encoding="utf-8") as file:
+        json.dump(list(detoxify.class_names), file, indent=4)
+
+    for filename in ("model.onnx", "model.int8.onnx"):
+        size = os.path.getsize(os.path.join(out, filename)) / 1024 / 1024
+        print(f"{filename}: {round(size, 2)} MB")
+
+
+def validate(
+    model_type: str, out: str, filename: str, corpus: str, tolerance: float
+) -> bool:
+    """
+    Compare ONNX scores against the PyTorch model on the fixture corpus
+
+    Returns whether every score was within tolerance
+    """
+    with open(corpus, "r", encoding="utf-8") as file:
+        texts = json.load(file)
+
+    detoxify = Detoxify(model_type=model_type, device="cpu")
+    backend = OnnxBackend(None, out, filename)
+
+    start = time.perf_counter()
+    with torch.inference_mode():
+        expected = detoxify.predict(texts)
+    torch_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = backend.run(texts)
+    onnx_time = time.perf_counter() - start
+
+    report = {
+        "texts": len(texts),
+        "torch_seconds": round(torch_time, 4),
+        "onnx_seconds": round(onnx_time, 4),
+        "labels": {},
+    }
+    passed = True
+    for label in backend.labels:
+        diffs = [abs(a - b) for a, b in zip(actual[label], expected[label])]
+        flips = sum(
+            (a > 0.75) != (b > 0.75) for a, b in zip(actual[label], expected[label])
+        )
+        report["labels"][label] = {
+            "max_diff": round(max(diffs), 5),
+            "mean_diff": round(sum(diffs) / len(diffs), 5),
+            "threshold_flips": flips,
+        }
+        passed = passed and max(diffs) <= tolerance
+
+    report["passed"] = passed
+    print(json.dumps(report, indent=4))
+    return passed
+
+
+def main() -> None:
+    """
+    Parse arguments and run
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("action", choices=("export", "validate"))
+    parser.add_argument("--model", default="unbiased")
+    parser.add_argument("--out", default="models/sentinel")
+    parser.add_argument("--file", default="model.int8.onnx")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--corpus", default="assets/sentinel_corpus.json")
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.action == "export":
+        export(args.model, args.out, args.opset)
+    elif not validate(args.model, args.out, args.file, args.corpus, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Benchmark how long stored tags take to run and which blocks the time goes to
+
+Run from the repository root
+
+    python scripts/tagscript_bench.py --db bot/databases/servers.db
+    python scripts/tagscript_bench.py --guild 1234 --runs 50 --flag-ms 25 --out tags.json
+
+Every tagscript in tags_tags is replayed through the same ProfilingInterpreter and
+block list the Tags cog uses, seeded by to_seed from a fake context so nothing
+touches discord. Actions like embeds or redirects are collected but never acted on.
+
+Each tag is run --runs times for its latency, then once more with the per block
+profiler on. Blocks are reported in the order the interpreter tries them with how
+often they accepted a verb and the time they cost, tags slower than --flag-ms are
+listed on their own so pathological ones can be found before they're used.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bot")
+)
+
+# pylint: disable=wrong-import-position
+import bTagScript as tse
+from cogs.tags import tag_blocks, to_seed
+from gears.tagscript import BlockTiming, ProfilingInterpreter
+
+CREATED_AT = datetime.datetime(2021, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class FakeAsset:
+    """
+    An avatar, only the url is read
+    """
+
+    __slots__ = ("url",)
+
+    def __init__(self, url: str) -> None:
+        """
+        Init the asset
+        """
+        self.url = url
+
+
+class FakeMember:
+    """
+    The parts of discord.Member MemberAdapter reads
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "display_name",
+        "discriminator",
+        "mention",
+        "bot",
+        "color",
+        "created_at",
+        "display_avatar",
+        "banner",
+    )
+
+    def __init__(self, user_id: int) -> None:
+        """
+        Init the member
+        """
+        self.id = user_id
+        self.name = f"User{user_id}"
+        self.display_name = self.name
+        self.discriminator = "0001"
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+        self.color = 0
+        self.created_at = CREATED_AT
+        self.display_avatar = FakeAsset(f"https://example.com/{user_id}.png")
+        self.banner = None
+
+
+class FakeChannel:
+    """
+    The parts of a channel ChannelAdapter reads
+    """
+
+    __slots__ = ("id", "name", "created_at")
+
+    def __init__(self, channel_id: int) -> None:
+        """
+        Init the channel
+        """
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.created_at = CREATED_AT
+
+
+class FakeGuild:
+    """
+    The parts of discord.Guild GuildAdapter reads
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "created_at",
+        "members",
+        "member_count",
+        "icon",
+        "description",
+    )
+
+    def __init__(self, guild_id: int, members: List[FakeMember]) -> None:
+        """
+        Init the guild
+        """
+        self.id = guild_id
+        self.name = f"Guild {guild_id}"
+        self.created_at = CREATED_AT
+        self.members = members
+        self.member_count = len(members)
+        self.icon = None
+        self.description = None
+
+
+class FakeMessage:
+    """
+    The parts of discord.Message to_seed reads
+    """
+
+    __slots__ = ("mentions",)
+
+    def __init__(self, mentions: List[FakeMember]) -> None:
+        """
+        Init the message
+        """
+        self.mentions = mentions
+
+
+class FakeContext:
+    """
+    The parts of commands.Context to_seed reads
+    """
+
+    __slots__ = ("author", "message", "channel", "guild")
+
+    def __init__(self, guild_id: int, mention: bool) -> None:
+        """
+        Init the context with a guild of a few members
+        """
+        members = [FakeMember(user_id) for user_id in range(1, 11)]
+        self.author = members[0]
+        self.message = FakeMessage(members[1:2] if mention else [])
+        self.channel = FakeChannel(1)
+        self.guild = FakeGuild(int(guild_id or 1), members)
+
+
+def load_corpus(
+    path: str, guild: Optional[str], limit: Optional[int]
+) -> List[sqlite3.Row]:
+    """
+    Read the stored tags to replay
+    """
+    query = "SELECT tag_id, guild, name, tagscript FROM tags_tags"
+    params = []
+    if guild:
+        query += " WHERE guild = ?"
+        params.append(guild)
+    query += " ORDER BY CAST(tag_id AS INTEGER)"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as db:
+        db.row_factory = sqlite3.Row
+        return db.execute(query, params).fetchall()
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Nearest rank percentile of already sorted values
+    """
+    if not values:
+        return 0
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return round(values[index], 3)
+
+
+async def run_tag(
+    tsei: ProfilingInterpreter, tag: sqlite3.Row, args: argparse.Namespace
+) -> dict:
+    """
+    Run one tag runs times for latency and once with the profiler on
+    """
+    ctx = FakeContext(tag["guild"], args.mention)
+    latencies: List[float] = []
+    errors = 0
+    error = None
+    profile: Dict[str, BlockTiming] = {}
+
+    for index in range(args.runs + 1):
+        seeds = {"args": tse.StringAdapter(args.args)}
+        seeds.update(to_seed(ctx))
+        profiled = index == args.runs
+        start = time.perf_counter()
+        try:
+            response = await tsei.process(
+                tag["tagscript"],
+                seed_variables=seeds,
+                charlimit=args.charlimit,
+                profile=profiled,
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            errors += 1
+            error = error or f"{type(e).__name__}: {e}"
+            continue
+        if profiled:
+            profile = response.extras["profile"]
+        else:
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    return {
+        "tag_id": tag["tag_id"],
+        "guild": tag["guild"],
+        "name": tag["name"],
+        "length": len(tag["tagscript"]),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        "max_ms": round(latencies[-1], 3) if latencies else None,
+        "latencies": latencies,
+        "errors": errors,
+        "error": error,
+        "profile": profile,
+    }
+
+
+async def bench(args: argparse.Namespace) -> dict:
+    """
+    Replay the corpus and build the report
+    """
+    corpus = load_corpus(args.db, args.guild, args.limit)
+    tsei = ProfilingInterpreter(tag_blocks())
+    blocks = {type(block).__name__: BlockTiming() for block in tsei.blocks}
+
+    start = time.perf_counter()
+    results = []
+    for index, tag in enumerate(corpus, 1):
+        result = await run_tag(tsei, tag, args)
+        for name, timing in result.pop("profile").items():
+            blocks[name].merge(timing)
+        results.append(result)
+        if index % 100 == 0:
+            print(f"{index}/{len(corpus)} tags", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(
+        latency for result in results for latency in result.pop("latencies")
+    )
+    flagged = sorted(
+        (
+            result
+            for result in results
+            if result["max_ms"] is not None and result["max_ms"] >= args.flag_ms
+        ),
+        key=lambda result: result["max_ms"],
+        reverse=True,
+    )
+    return {
+        "tags": len(corpus),
+        "runs_per_tag": args.runs,
+        "seconds": round(elapsed, 4),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(latencies[-1], 3) if latencies else 0,
+        },
+        "blocks": [
+            {
+                "position": position,
+                "block": name,
+                "checks": timing.checks,
+                "accepted": timing.hits,
+                "accept_rate": (
+                    round(timing.hits / timing.checks * 100, 2) if timing.checks else 0
+                ),
+                "check_ms": round(timing.check_time * 1000, 3),
+                "process_ms": round(timing.process_time * 1000, 3),
+            }
+            for position, (name, timing) in enumerate(blocks.items())
+        ],
+        "flagged": flagged,
+        "errored": [
+            {key: result[key] for key in ("tag_id", "name", "errors", "error")}
+            for result in results
+            if result["errors"]
+        ],
+    }
+
+
+def main() -> None:
+    """
+    Parse arguments and run
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default="bot/databases/servers.db")
+    parser.add_argument("--guild", default=None, help="Only replay this guilds tags")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--args", default="", help="What {args} is seeded with")
+    parser.add_argument(
+        "--mention", action="store_true", help="Seed {target} with a mentioned user"
+    )
+    parser.add_argument("--charlimit", type=int, default=None)
+    parser.add_argument("--flag-ms", type=float, default=50)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    report = asyncio.run(bench(args))
+    output = json.dumps(report, indent=4)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            file.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()